@@ -1,2 +1,7 @@
-from .game import Game
-
+def __getattr__(name):
+    # import the engine on first use only, so that importing wuki.cli for
+    # `wuki --help` does not load it
+    if name == 'Game':
+        from .game import Game
+        return Game
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
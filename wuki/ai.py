@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 from .board import White, Black, Board, Square
 from .piece import King, Queen, Rook, Bishop, Knight, Pawn
 
@@ -11,8 +13,17 @@ class WukiAI:
             Pawn(Black): 1,
             }
 
+    #: :type: int
+    #:
+    #: How many board positions :meth:`evaluate_board` remembers the score
+    #: of, the least recently used ones are forgotten first.
+    TRANSPOSITION_TABLE_SIZE = 2**16
+
     def __init__(self, color):
         self.color = color
+        # scores of evaluated positions by board position (see Board._hash)
+        # and captured pieces, see evaluate_board()
+        self._transpositions = OrderedDict()
 
     def get_move(self, board, color=None):
         """Get a move for a board position.
@@ -28,14 +39,17 @@ class WukiAI:
         #print("Trying to think of a good move.")
         if color is None:
             color = self.color
-        possible_moves = board.possible_moves(self.color)
+        possible_moves = board.possible_moves(color)
         move_rating = dict()
         for move in possible_moves:
-            resulting_board = board.make_move(*move, color=self.color)
-            score = self.evaluate_board(resulting_board)
+            undo = board.do_move(*move)
+            try:
+                score = self.evaluate_board(board)
+            finally:
+                board.undo_move(undo)
             move_rating[move] = score
             #print(move, score)
-        best_move = max(move_rating, key=lambda m: move_rating[m])
+        best_move = max(move_rating, key=move_rating.get)
         return best_move
 
     def evaluate_board(self, board):
@@ -47,11 +61,26 @@ class WukiAI:
 
         :returns int score: a score how well the own color is doing on the boar.
             Higher is better.
+
+        The scores are remembered by board position (see
+        :attr:`TRANSPOSITION_TABLE_SIZE`), so positions reached by different
+        moves are only evaluated once.
         """
+        key = (board._hash,
+               tuple(sorted(piece.letter for piece in board.captured[White])),
+               tuple(sorted(piece.letter for piece in board.captured[Black])))
+        score = self._transpositions.get(key)
+        if score is not None:
+            self._transpositions.move_to_end(key)
+            return score
         possible_moves = board.possible_moves(self.color)
         evaluators = [getattr(self, f) for f in dir(self) if f.startswith('eval_')]
         results = {f.__name__: f(board, possible_moves) for f in evaluators}
-        return sum(results.values())
+        score = sum(results.values())
+        self._transpositions[key] = score
+        while len(self._transpositions) > self.TRANSPOSITION_TABLE_SIZE:
+            self._transpositions.popitem(last=False)
+        return score
 
     def eval_captured(self, board, *args):
         """Pieces oneself captured are scored positively by their value in pawns,
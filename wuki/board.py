@@ -11,11 +11,12 @@ This module includes classes that make up a board:
     - :class:`Board` manages the state of one board position as well as
         generating possible moves
 """
-from typing import Union, Tuple, Set, List
+from typing import Union, Tuple, Set, List, Dict
 
 from math import sqrt
+from random import Random
+from collections import OrderedDict
 
-from . import piece as pc
 from .exceptions import IllegalMoveError
 
 #: :type: int
@@ -23,6 +24,19 @@ from .exceptions import IllegalMoveError
 #: The number of squares per side of a board.
 BOARD_LEN = 8
 
+# Square.index of all squares outside of the board
+_OUTSIDE = BOARD_LEN**2
+
+#: :type: int
+#:
+#: For how many board positions :meth:`Board.attacked` remembers the attacked
+#: squares across boards, the least recently used ones are forgotten first.
+ATTACKED_CACHE_SIZE = 2**16
+
+# attacked squares by board position hash (see Board._hash) and player, see
+# Board.attacked()
+_attacked = OrderedDict()
+
 class Color:
     """Collection of convenience functions for piece, square, player colors.
 
@@ -64,17 +78,32 @@ class Color:
     def __hash__(self):
         return self.color
 
+    def __index__(self):
+        """Colors can index sequences with an entry for white and one for
+        black, like :attr:`.piece.AbstractPiece.symbol`."""
+        return self.color
+
     def __invert__(self):
         """`~` operator. Get the inverse of a color.
 
-        :returns: the opposite color
+        :returns: the opposite color, one of the primary instances
+            :data:`White` and :data:`Black`
         :rtype: Color
         """
-        return Color(1-self.color)
+        return Black if self.color == self.WHITE else White
 
     def __eq__(self, other):
         return self.color == other.color
 
+    def __reduce__(self):
+        # unpickle to the primary instances, pieces compare colors by identity
+        return (_color, (self.color,))
+
+
+def _color(color:int) -> Color:
+    """Return the primary :class:`Color` instance for an internal color value."""
+    return White if color == Color.WHITE else Black
+
 
 #: :type: Color
 #:
@@ -90,10 +119,21 @@ White = Color(Color.WHITE)
 Black = Color(Color.BLACK)
 
 
+#: :type: Dict[Tuple[int,int], Square]
+#:
+#: All squares on the board by their coordinates, see :class:`Square`.
+_SQUARES = {}
+
 class Square:
-    """A square on the board."""
+    """A square on the board.
+
+    Squares are never changed after they are created, so there's only one
+    instance of every square on the board that is handed out whenever it is
+    instanciated. Only squares outside of the board are created anew.
+    """
+    __slots__ = ('x', 'y', 'index', '_hash', '_diagonals', '_orthogonals')
 
-    def __init__(self, x:Union[str, int, Tuple[int,int], Tuple[str,int]], y:int=None):
+    def __new__(cls, x:Union[str, int, Tuple[int,int], Tuple[str,int]], y:int=None):
         """A Square can be instanciated from a pair of coordinates either in
 
         - numerical form (x, y) where x and y should lie between 0 and :data:`BOARD_LEN`-1,
@@ -115,12 +155,13 @@ class Square:
 
         .. automethod:: __add__
         """
-        self._diagonals = None
-
-        if isinstance(x, Square):
-            self.x = x.x
-            self.y = x.y
-            return
+        if y is not None:
+            # the most common case, numerical coordinates on the board
+            square = _SQUARES.get((x, y))
+            if square is not None:
+                return square
+        elif isinstance(x, Square):
+            return x
         if y is None:
             xy = x
         else:
@@ -128,14 +169,35 @@ class Square:
 
         if isinstance(xy[0], int):
             # coordinates given numerically: (1,4)
-            self.x, self.y = xy
+            x, y = xy
         elif isinstance(xy[0], str):
             # coordinates given in chess notation: ('b',5) or 'b5'
-            self.x = "abcdefgh".index(xy[0])
-            self.y = int(xy[1]) - 1
+            x = "abcdefgh".index(xy[0])
+            y = int(xy[1]) - 1
         else:
             raise ValueError("Given coordinates have either (x,y) or (file,rank)")
 
+        square = _SQUARES.get((x, y))
+        if square is None:
+            square = super().__new__(cls)
+            square.x = x
+            square.y = y
+            #: :type: int
+            #:
+            #: Number of the square on the board, counting files first from
+            #: a1 (0) to h8 (63). Its bit in a bitboard, see
+            #: :meth:`Board.occupied`. All squares outside of the board have
+            #: the number 64.
+            square.index = y*BOARD_LEN + x if 0 <= x < BOARD_LEN and 0 <= y < BOARD_LEN else _OUTSIDE
+            square._hash = hash((x, y))
+            square._diagonals = None
+            square._orthogonals = None
+        return square
+
+    def __reduce__(self):
+        # unpickle to the one instance of the square
+        return (Square, (self.x, self.y))
+
     def __repr__(self):
         return f"<Square {self} x={self.x} y={self.y}>"
 
@@ -143,9 +205,12 @@ class Square:
         return ''.join([str(c) for c in self.file_rank()])
 
     def __hash__(self):
-        return hash((self.x, self.y))
+        # same as the (x, y) tuple's, squares compare equal to those
+        return self._hash
 
     def __eq__(self, other):
+        if other is self:
+            return True
         if isinstance(other, tuple) and len(other) == 2:
             other = Square(other)
         elif not isinstance(other, Square):
@@ -161,7 +226,10 @@ class Square:
         """
         if not len(other) == 2:
             raise TypeError("Only a tuple of length two can be added to a Square")
-        return Square(self.x+other[0], self.y+other[1])
+        x, y = self.x+other[0], self.y+other[1]
+        # squares on the board are interned, skip Square.__new__ for them
+        square = _SQUARES.get((x, y))
+        return square if square is not None else Square(x, y)
 
     @property
     def file(self) -> str:
@@ -185,27 +253,31 @@ class Square:
 
     def within_board(self) -> bool:
         """Wether a position is within the bounds of the board"""
-        return 0 <= self.x < BOARD_LEN and 0 <= self.y < BOARD_LEN
+        # all squares outside of the board share the index past the last one
+        return self.index != _OUTSIDE
 
     def color(self) -> Color:
         """Returns the color of the square on the board. (0,0)/a1 is Black."""
         return Color((self.x+1)%2 ^ self.y%2)
 
-    def diagonals(self) -> set:
+    def diagonals(self) -> frozenset:
         """Gives all diagonally connected positions within the board (including self)"""
+        # squares are interned, so every square computes its rays only once
         if self._diagonals is None:
             rising   = [Square(self.x+i, self.y+i) for i in range(BOARD_LEN)]
             rising  += [Square(self.x-i, self.y-i) for i in range(BOARD_LEN)]
             falling  = [Square(self.x+i, self.y-i) for i in range(BOARD_LEN)]
             falling += [Square(self.x-i, self.y+i) for i in range(BOARD_LEN)]
-            self._diagonals = set(filter(within_board, rising+falling))
+            self._diagonals = frozenset(filter(within_board, rising+falling))
         return self._diagonals
 
-    def orthogonals(self) -> set:
+    def orthogonals(self) -> frozenset:
         """Gives all orthogonally connected positions within the board (including self)"""
-        horizontal = [Square(x, self.y) for x in range(BOARD_LEN)]
-        vertical =   [Square(self.x, y) for y in range(BOARD_LEN)]
-        return set(horizontal + vertical)
+        if self._orthogonals is None:
+            horizontal = [Square(x, self.y) for x in range(BOARD_LEN)]
+            vertical =   [Square(self.x, y) for y in range(BOARD_LEN)]
+            self._orthogonals = frozenset(horizontal + vertical)
+        return self._orthogonals
 
     def dist(self, other) -> float:
         """Euclidean distance between this square and another.
@@ -259,6 +331,97 @@ class Square:
 def within_board(x, y=None):
     return Square(x,y).within_board()
 
+_SQUARES.update({(x, y): Square(x, y) for x in range(BOARD_LEN) for y in range(BOARD_LEN)})
+
+
+#: Directions of the rays along which rooks (orthogonal) and bishops
+#: (diagonal) move, queens move along both.
+_ORTHOGONAL_RAYS = ((+1, 0), (-1, 0), (0, +1), (0, -1))
+_DIAGONAL_RAYS = ((+1, +1), (-1, +1), (+1, -1), (-1, -1))
+
+#: Offsets from which a knight attacks a square.
+_KNIGHT_JUMPS = ((+1, +2), (-1, +2), (+1, -2), (-1, -2),
+                 (+2, +1), (-2, +1), (+2, -1), (-2, -1))
+
+def _ray_squares(square:Square, direction:Tuple[int,int]) -> Tuple[Square, ...]:
+    """The squares on the board along a ray from a square, nearest first."""
+    dx, dy = direction
+    x, y = square.x+dx, square.y+dy
+    squares = []
+    while 0 <= x < BOARD_LEN and 0 <= y < BOARD_LEN:
+        squares.append(Square(x, y))
+        x, y = x+dx, y+dy
+    return tuple(squares)
+
+#: The squares along the rays from every square on the board by direction
+#: and :attr:`Square.index`, nearest first.
+_RAYS = {direction: tuple(_ray_squares(_SQUARES[index%BOARD_LEN, index//BOARD_LEN], direction) for index in range(BOARD_LEN**2))
+         for direction in _ORTHOGONAL_RAYS+_DIAGONAL_RAYS}
+
+#: The squares on the board by :attr:`Square.index`.
+_SQUARE_AT = tuple(_SQUARES[index%BOARD_LEN, index//BOARD_LEN] for index in range(BOARD_LEN**2))
+
+def _bitboard(squares) -> int:
+    """The bitboard (see :meth:`Board.occupied`) of some squares."""
+    bitboard = 0
+    for square in squares:
+        bitboard |= 1 << square.index
+    return bitboard
+
+def _squares(bitboard:int) -> List[Square]:
+    """The squares in a bitboard (see :meth:`Board.occupied`)."""
+    squares = []
+    while bitboard:
+        lowest = bitboard & -bitboard
+        squares.append(_SQUARE_AT[lowest.bit_length()-1])
+        bitboard ^= lowest
+    return squares
+
+#: Bitboards of the squares along the rays from every square on the board,
+#: by direction and :attr:`Square.index`.
+_RAY_MASKS = {direction: tuple(_bitboard(squares) for squares in rays) for direction, rays in _RAYS.items()}
+
+#: Directions along which the :attr:`Square.index` increases, the nearest
+#: square on these rays is the lowest bit of a bitboard.
+_ASCENDING_RAYS = {direction for direction in _RAYS if (direction[1], direction[0]) > (0, 0)}
+
+#: Bitboards of the squares a king or a knight on every square of the board
+#: moves to, by :attr:`Square.index`.
+_KING_ATTACKS = tuple(_bitboard(_RAYS[direction][index][0] for direction in _RAYS if _RAYS[direction][index])
+                      for index in range(BOARD_LEN**2))
+_KNIGHT_ATTACKS = tuple(_bitboard(_SQUARES[square.x+dx, square.y+dy] for dx, dy in _KNIGHT_JUMPS
+                                  if 0 <= square.x+dx < BOARD_LEN and 0 <= square.y+dy < BOARD_LEN)
+                        for square in _SQUARE_AT)
+
+#: Bitboards of the squares a pawn on every square of the board attacks, by
+#: :attr:`Color.color` and :attr:`Square.index`.
+_PAWN_ATTACKS = tuple(tuple(_bitboard(_SQUARES[square.x+dx, square.y+direction] for dx in (-1, +1)
+                                      if 0 <= square.x+dx < BOARD_LEN and 0 <= square.y+direction < BOARD_LEN)
+                            for square in _SQUARE_AT)
+                      for direction in (White.direction, Black.direction))
+
+def _ray_attacks(direction:Tuple[int,int], index:int, occupied:int) -> int:
+    """Bitboard of the squares along a ray from the square with
+    :attr:`Square.index` `index` up to and including the first occupied one.
+    """
+    ray = _RAY_MASKS[direction][index]
+    blockers = ray & occupied
+    if not blockers:
+        return ray
+    if direction in _ASCENDING_RAYS:
+        nearest = (blockers & -blockers).bit_length()-1
+    else:
+        nearest = blockers.bit_length()-1
+    return ray ^ _RAY_MASKS[direction][nearest]
+
+def _ray(square:Square, other:Square) -> Tuple[int,int]:
+    """Direction of the ray from `square` through `other`, `None` if they
+    don't share a rank, file or diagonal."""
+    dx, dy = other.x-square.x, other.y-square.y
+    if (dx or dy) and (not dx or not dy or abs(dx) == abs(dy)):
+        return ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+    return None
+
 
 class Board:
     """Stores a board position.
@@ -283,10 +446,25 @@ class Board:
         """
         # TODO check if two pieces are on the same square
         # TODO check if pieces are within board
-        self._pieces = set(pieces)
+        self._pieces = set()
         self.index = dict()
-        for piece in self._pieces:
-            self.index[piece.position] = piece
+        # the pieces by Square.index, the last entry is for the squares
+        # outside of the board and always empty
+        self._mailbox = [None] * (BOARD_LEN**2 + 1)
+        # the pieces by (internal color value, kind name), see pieces()
+        self._by_kind = dict()
+        # bitboards of the squares occupied by each color, see occupied()
+        self._occupied = [0, 0]
+        # Zobrist hash of the position, kept up to date as pieces are added
+        # and removed. Equal positions have equal hashes, no matter how they
+        # were reached.
+        self._hash = 0
+        for piece in set(pieces):
+            self._place(piece)
+        # possible moves of the pieces on this board (see
+        # Piece.possible_moves()) and attacked squares (see attacked()). Has
+        # to be reset whenever the board changes.
+        self._moves_cache = {}
         if captured:
             # make a deep copy because lists are mutable
             #: A dictionary with the keys :data:`White` and :data:`Black`,
@@ -296,6 +474,15 @@ class Board:
         else:
             self.captured = {White:set(), Black:set()}
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_moves_cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._moves_cache = {}
+
     def __repr__(self):
         return f"<Board pieces={len(self)} {self._pieces}>"
 
@@ -320,7 +507,10 @@ class Board:
         """
         if not isinstance(key, Square):
             key = Square(key)
-        return self.index[key]
+        piece = self._mailbox[key.index]
+        if piece is None:
+            raise KeyError(key)
+        return piece
 
     def __contains__(self, item) -> bool:
         """If Board is checked against a :class:`Square`, it will return `True` if there's
@@ -331,7 +521,7 @@ class Board:
         if isinstance(item, tuple) and len(item) == 2:
             item = Square(item)
         if isinstance(item, Square):
-            return item in self.index
+            return self._mailbox[item.index] is not None
         elif isinstance(item, pc.AbstractPiece):
             # we have to cast to list since set.__contains__ compares hashes
             # and these are different for Piece and AbstractPiece.
@@ -357,7 +547,7 @@ class Board:
             self._iter = Square(0, self._iter.y+1)
         else:
             raise StopIteration
-        return self._iter, self[self._iter] if self._iter in self.index else None
+        return self._iter, self._mailbox[self._iter.index]
 
     def remove(self, piece):
         """Remove a piece from the board.
@@ -368,8 +558,8 @@ class Board:
 
         :raises KeyError: if the piece is not on the board
         """
-        del self.index[piece.position]
-        self._pieces.remove(piece)
+        self._lift(piece)
+        self._moves_cache = {}
         assert piece not in self
         assert piece.position not in self.index
         return piece
@@ -399,8 +589,8 @@ class Board:
         """
         if piece.position in self:
             raise ValueError("Target square already has a piece on it")
-        self._pieces.add(piece)
-        self.index[piece.position] = piece
+        self._place(piece)
+        self._moves_cache = {}
         assert piece in self
         assert self.index[piece.position] == piece
         return self.pieces()
@@ -417,7 +607,61 @@ class Board:
 
         :returns: set of pieces on the board matching the conditions
         """
-        return set([p for p in self._pieces if (p == kind if kind is not None else True) and (p.color == color if color is not None else True)])
+        if kind is None:
+            return set([p for p in self._pieces if (p.color == color if color is not None else True)])
+        pieces = set()
+        for color_ in ([White, Black] if color is None else [color]):
+            pieces |= self._by_kind.get((color_.color, kind.name), set())
+        if isinstance(kind, pc.Piece):
+            # a Piece only matches the pieces equal to it
+            pieces = set([p for p in pieces if p == kind])
+        return pieces
+
+    def occupied(self, color:Color=None) -> int:
+        """Returns a bitboard of the occupied squares: bit
+        :attr:`Square.index` is set if there's a piece on that square.
+
+        :param color: only squares with pieces of that color
+        """
+        if color is None:
+            return self._occupied[0] | self._occupied[1]
+        return self._occupied[color.color]
+
+    def _place(self, piece):
+        """Put a piece on the board and into all the indices, without any
+        checks or resetting the possible moves."""
+        self._pieces.add(piece)
+        self.index[piece.position] = piece
+        self._mailbox[piece.position.index] = piece
+        self._by_kind.setdefault((piece.color.color, piece.name), set()).add(piece)
+        self._occupied[piece.color.color] |= 1 << piece.position.index
+        self._hash ^= _ZOBRIST[piece.piece_type, piece.letter][piece.position]
+
+    def _lift(self, piece):
+        """Take a piece off the board and out of all the indices, the
+        counterpart of :meth:`_place`."""
+        del self.index[piece.position]
+        self._mailbox[piece.position.index] = None
+        self._pieces.remove(piece)
+        self._by_kind[piece.color.color, piece.name].remove(piece)
+        self._occupied[piece.color.color] &= ~(1 << piece.position.index)
+        self._hash ^= _ZOBRIST[piece.piece_type, piece.letter][piece.position]
+
+    def copy(self):
+        """:returns: A new board with the same pieces, which can be modified
+            independently of this one.
+        :rtype: Board
+        """
+        board = Board.__new__(Board)
+        board._pieces = self._pieces.copy()
+        board.index = self.index.copy()
+        board._mailbox = self._mailbox.copy()
+        board._by_kind = {key: pieces.copy() for key, pieces in self._by_kind.items()}
+        board._occupied = self._occupied.copy()
+        board._hash = self._hash
+        board.captured = {White:self.captured[White].copy(), Black:self.captured[Black].copy()}
+        board._moves_cache = {}
+        return board
 
     def make_move(self, piece, target:Square):
         """Move on the current board and return the new board. This does not
@@ -433,35 +677,81 @@ class Board:
         :raises IllegalMoveError: when move cannot be made
         """
         # TODO check for check, checkmate
-        new_board = Board(self._pieces, captured=self.captured)
+        captured = self._mailbox[target.index]
+        if captured is not None and captured.color == piece.color:
+            raise IllegalMoveError(f"Cannot capture own piece {self[target]}")
+        if target not in piece.possible_moves(self):
+            raise IllegalMoveError(str(piece)+str(target))
+        new_board = self.copy()
+        new_board.do_move(piece, target)
+        return new_board
 
-        if target in new_board:
-            # there is something on the board
-            if new_board[target].color == piece.color:
-                raise IllegalMoveError("Cannot capture own piece {self[target]}")
-            else:
-                # capturing the piece
-                new_board.capture(new_board[target])
+    def do_move(self, piece, target:Square) -> tuple:
+        """Move on this board in place, without checking if the move is legal.
+        The move can be taken back with :meth:`undo_move`, which makes
+        trying out moves cheaper than :meth:`make_move`.
+
+        :param Piece piece: the Piece that is supposed to be moved. It includes its
+            position on the board
+        :param target: the quare where the pieces is to be moved to
+
+        :returns: the information needed to undo the move: a tuple of the
+            pieces that left and entered the board and the possible moves
+            cached for the board before the move.
+
+        :raises IllegalMoveError: when the move would capture an own piece
+        """
+        mailbox = self._mailbox
+        removed = []
+        added = []
+
+        captured = mailbox[target.index]
+        if captured is not None:
+            if captured.color == piece.color:
+                raise IllegalMoveError(f"Cannot capture own piece {self[target]}")
+            self.captured[captured.color].add(captured)
 
         # castling
-        if piece.piece == pc.King() and abs(piece.position.x - target.x) == 2:
+        if piece.piece_type is pc.King and abs(piece.position.x - target.x) == 2:
             if piece.position.x < target.x:
                 # kingside
-                rook = new_board[Square(7, target.y)]
+                rook = mailbox[Square(7, target.y).index]
                 rook_target = Square(5, target.y)
             else:
                 # queenside
-                rook = new_board[Square(0, target.y)]
+                rook = mailbox[Square(0, target.y).index]
                 rook_target = Square(3, target.y)
-            new_board.remove(rook)
-            # ommit board to prevent legality check
-            rook = rook.move_to(rook_target)
-            new_board.add(rook)
-
-        new_board.remove(piece)
-        piece = piece.move_to(target, board=self)
-        new_board.add(piece)
-        return new_board
+            removed.append(rook)
+            added.append(rook.move_to(rook_target))
+
+        if captured is not None:
+            removed.append(captured)
+        # the piece on the board, `piece` might only be equal to it
+        removed.append(mailbox[piece.position.index])
+        added.append(piece.move_to(target))
+
+        for removed_piece in removed:
+            self._lift(removed_piece)
+        for added_piece in added:
+            self._place(added_piece)
+        moves_cache = self._moves_cache
+        self._moves_cache = {}
+        return (captured, tuple(removed), tuple(added), moves_cache)
+
+    def undo_move(self, move:tuple):
+        """Take back a move made with :meth:`do_move`.
+
+        :param move: what :meth:`do_move` returned. Moves have to be undone
+            in the reverse order they were made in.
+        """
+        captured, removed, added, moves_cache = move
+        for added_piece in added:
+            self._lift(added_piece)
+        for removed_piece in removed:
+            self._place(removed_piece)
+        if captured is not None:
+            self.captured[captured.color].remove(captured)
+        self._moves_cache = moves_cache
 
     def possible_moves(self, player, give_check=False):
         """Return a set of all possible moves a player could make.
@@ -477,11 +767,11 @@ class Board:
         """
         possible_moves = set()
         for piece in self.pieces(color=player):
-            if give_check and piece == pc.King():
+            if give_check and piece.piece_type is pc.King:
                 # We need to ignore King()s in order to check which squares are
                 # blocked for the other King because people are attacking it.
                 pass
-            elif give_check and piece == pc.Pawn(player):
+            elif give_check and piece.piece_type is pc.Pawn:
                 # When returning only the squares that would give check if the
                 # opponent king moved to it, we need to look at the quares a
                 # Pawn can capture at not move to.
@@ -491,24 +781,138 @@ class Board:
                 possible_moves |= {(piece, target) for target in piece.piece.legal_moves(piece.position, self, only_attacked=True)}
             else:
                 possible_moves |= {(piece, target) for target in piece.possible_moves(self)}
-        if not give_check:
-            # We need to remove all moves that end up in a check, but since
-            # we check for attacked squares in .is_check, we have to exclude
-            # this check in order to evade a recursion
-            for move in possible_moves.copy():
-                if self.make_move(*move).is_check(player):
-                    possible_moves.discard(move)
-        return possible_moves
-
-    def is_check(self, player:Color) -> bool:
+        if give_check or not possible_moves:
+            return possible_moves
+        # We need to remove all moves that end up in a check, but since
+        # we check for attacked squares in .is_check, we have to exclude
+        # this check in order to evade a recursion
+        legal_moves = set()
+        # Unless in check, only moves of the King or of pieces that shield
+        # it can end up in check, the others don't have to be tried out.
+        safe = ~self._pinned(player) if not self.is_check(player) else 0
+        for move in possible_moves:
+            piece = move[0]
+            if safe >> piece.position.index & 1 and piece.piece_type is not pc.King:
+                legal_moves.add(move)
+                continue
+            undo = self.do_move(*move)
+            try:
+                if not self.is_check(player):
+                    legal_moves.add(move)
+            finally:
+                self.undo_move(undo)
+        return legal_moves
+
+    def attacked(self, player:Color) -> int:
+        """Returns a bitboard (see :meth:`occupied`) of the squares `player`
+        attacks, i.e. the targets of :meth:`possible_moves` with
+        `give_check`. It is kept until the board changes, and by board
+        position (see :attr:`ATTACKED_CACHE_SIZE`).
+
+        :param player: the attacking player
+        """
+        key = ('attacked', player.color)
+        attacked = self._moves_cache.get(key)
+        if attacked is not None:
+            return attacked
+        # the same position might have come up on another board before
+        position_key = (self._hash, player.color)
+        attacked = _attacked.get(position_key)
+        if attacked is not None:
+            _attacked.move_to_end(position_key)
+        else:
+            attacked = 0
+            # same as possible_moves(give_check=True), without creating the
+            # target squares
+            for piece in self.pieces(color=player):
+                if piece.piece_type is pc.King:
+                    continue
+                elif piece.piece_type is pc.Pawn:
+                    attacked |= _PAWN_ATTACKS[player.color][piece.position.index]
+                else:
+                    attacked |= piece.moves_bitboard(self)
+            _attacked[position_key] = attacked
+            while len(_attacked) > ATTACKED_CACHE_SIZE:
+                _attacked.popitem(last=False)
+        self._moves_cache[key] = attacked
+        return attacked
+
+    def _pinned(self, player:Color) -> int:
+        """Returns a bitboard (see :meth:`occupied`) of the pieces of `player`
+        that might be pinned to their King: the first ones on a ray from the
+        King, if the next piece on the ray is an opponent's.
+
+        :param player: the player whose pieces to look for
+        """
+        occupied = self.occupied()
+        own = self.occupied(player)
+        pinned = 0
+        for king in self.pieces(kind=pc.piece_by_letter['K'], color=player):
+            index = king.position.index
+            for direction in _RAYS:
+                shield = _ray_attacks(direction, index, occupied) & own
+                if not shield:
+                    continue
+                behind = _ray_attacks(direction, shield.bit_length()-1, occupied) & occupied
+                if behind & ~own:
+                    pinned |= shield
+        return pinned
+
+    def is_check(self, player:Color, through:Set[Square]=None) -> bool:
         """Returns `True` if player is in check.
 
         :param player: the player to check for
+        :param through: only look for checks through these squares, see
+            :meth:`is_attacked`
 
         :returns: `True` if `player` is in check, `False` otherwise
         """
-        king = next(iter(self.pieces(kind=pc.King(), color=player)))
-        return king.position in {target for _, target in self.possible_moves(~player, give_check=True)}
+        king = next(iter(self.pieces(kind=pc.piece_by_letter['K'], color=player)))
+        return self.is_attacked(king.position, ~player, through=through)
+
+    def is_attacked(self, square:Square, player:Color, through:Set[Square]=None) -> bool:
+        """Returns `True` if a piece of `player` attacks a square. Like
+        :meth:`possible_moves` with `give_check`, Kings are not taken into
+        account.
+
+        Instead of generating all moves of `player`, only the rays from the
+        square and the squares a Knight or Pawn could attack it from are
+        looked at.
+
+        :param square: the square that might be under attack
+        :param player: the attacking player
+        :param through: if given, only look for attacks along rays through
+            or from these squares, e.g. the ones that changed in the last move
+
+        :returns: `True` if the square is under attack, `False` otherwise
+        """
+        x, y = square.x, square.y
+        mailbox = self._mailbox
+        jumps = [((dx, dy), 'Knight') for dx, dy in _KNIGHT_JUMPS]
+        jumps += [((dx, -player.direction), 'Pawn') for dx in (-1, +1)]
+        for (dx, dy), name in jumps:
+            attacker = Square(x+dx, y+dy)
+            if through is not None and attacker not in through:
+                continue
+            piece = mailbox[attacker.index]
+            if piece is not None and piece.name == name and piece.color == player:
+                return True
+
+        if through is None:
+            rays = [(ray, False) for ray in _ORTHOGONAL_RAYS] + [(ray, True) for ray in _DIAGONAL_RAYS]
+        else:
+            rays = {_ray(square, other) for other in through} - {None}
+            rays = [((dx, dy), bool(dx and dy)) for dx, dy in rays]
+        occupied = self.occupied()
+        for ray, diagonal in rays:
+            sliders = ('Bishop', 'Queen') if diagonal else ('Rook', 'Queen')
+            for ray_square in _RAYS[ray][square.index]:
+                if occupied >> ray_square.index & 1:
+                    piece = mailbox[ray_square.index]
+                    if piece.name in sliders and piece.color == player:
+                        return True
+                    break
+        return False
 
     def is_stalemate(self, player:Color) -> bool:
         """Returns `True` if player is stalemate but not checkmate. I.e. can not
@@ -570,11 +974,11 @@ class Board:
                 return f"\x1b[38;5;{fg}m\x1b[48;5;{bg}m{symbol}\x1b[0m"
             else:
                 if unicode:
-                    square_symbol = {White: ' ', Black: '█'}
-                    square_symbol_marked = {White: '░', Black: '▓'}
+                    square_symbol = (' ', '█')
+                    square_symbol_marked = ('░', '▓')
                 else:
-                    square_symbol = {White: ' ', Black: '#'}
-                    square_symbol_marked = {White: '.', Black: '@'}
+                    square_symbol = (' ', '#')
+                    square_symbol_marked = ('.', '@')
                 if square in self:
                     return self[square].symbol if unicode else self[square].letter
                 else:
@@ -594,3 +998,24 @@ class Board:
             print(f'  {color}:', ''.join(captured_symbols) if captured_symbols else 'none')
 
 
+class _ZobristTable(dict):
+    """Random 64 bit keys for every kind of piece (its class) and letter on
+    every square, generated when first needed. The generator is seeded with
+    the name of the class and the letter, so hashes are the same in every
+    process (and can be pickled), and kinds of pieces sharing a letter get
+    different keys."""
+
+    def __missing__(self, key:Tuple[type, str]) -> Dict[Square, int]:
+        kind, letter = key
+        rng = Random(f"{kind.__module__}.{kind.__qualname__} {letter}")
+        keys = self[key] = {square: rng.getrandbits(64) for square in _SQUARE_AT}
+        return keys
+
+#: Keys of the Zobrist hash of a board position by kind of piece, piece
+#: letter and square, see :class:`Board`.
+_ZOBRIST = _ZobristTable()
+
+
+# piece imports Color and Square from this module, so it can only be imported
+# once they are defined
+from . import piece as pc
@@ -53,19 +53,36 @@ It also has some neat features such as previewing possible moves for pieces.
 For more information about all commands that can be used within the interactive
 session, type :command:`help`.
 
+Replaying a long match file on every invocation is slow, so the replayed
+game is cached in :data:`CACHE_DIR`.
+The cache is only trusted as long as the match file's modification time and
+size are unchanged, or its content hash matches.
+Pass :option:`wuki --no-cache` to always replay the match file.
+
 For a full list of commandline arguments, refer to :class:`CLI`.
 """
 from typing import List
 
 import argparse
-import readline
 from sys import exit
-import atexit
+import os
+
+# The engine modules (and the ones only needed for caching) are imported where
+# they are needed, so that `--help` and argument errors don't pay for
+# importing them.
 
-from .game import Game
-from .board import Square, Board, White, Black
-from .exceptions import IllegalMoveError, MoveParseError, AmbigousMoveError
-from . import ai
+#: :type: str
+#:
+#: Directory in which replayed games are cached, keyed by match file path.
+CACHE_DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'wuki')
+
+#: :type: int
+#:
+#: Format of the cached games. Increase it when the pickled objects change, so
+#: that outdated caches are ignored.
+CACHE_VERSION = 10
 
 class BreakInteractiveException(Exception):
     pass
@@ -120,6 +137,10 @@ class CLI:
             
             Make a move in |SAN|_
 
+        .. option:: -N, --no-cache
+
+            Always replay the match file instead of using a cached game.
+
         .. option:: -s, --auto-save
 
             Automatically save new moves to the match file provided by
@@ -143,6 +164,8 @@ class CLI:
                 help='Play in an interactive session')
         parser.add_argument('-m', '--move', type=str,
                 help='Make a move')
+        parser.add_argument('-N', '--no-cache', action='store_true',
+                help="Always replay the match file instead of using a cached game")
         #parser.add_argument('-g', '--gui', action='store_true',
         #        help='Launch GUI')
         parser.add_argument('-s', '--auto-save', action='store_true',
@@ -153,20 +176,31 @@ class CLI:
         #: The parsed commandline arguments
         self.args = parser.parse_args(args)
 
-        moves = self.parse_match_file() if self.args.match_file else []
         #: :type: Game
         #:
         #: The underlying game object that is played on.
-        self.game = Game(moves)
+        self.game = self.load_game()
+
+        # Number of moves of `self.game` already in the match file and what
+        # they were written for (game, match file, last move), so
+        # auto-saving only has to append the new moves.
+        self._saved_move_count = 0
+        self._saved_for = None
+
+        #: :type: Dict[str, Callable]
+        #:
+        #: The commands available in interactive mode: the :meth:`cmd_`
+        #: methods by their name without prefix.
+        self.commands = {name[4:]: getattr(self, name) for name in dir(self) if name.startswith('cmd_')}
 
         if self.args.ai:
+            from . import ai
+            from .board import Black
             #: :type: ai.WukiAI
             #:
             #: If played against AI, the AI object is held here
             self.ai = ai.WukiAI(Black)
 
-        atexit.register(self.cmd_exit)
-
     def main(self):
         """Main function that provides the commandline interface.
 
@@ -191,14 +225,17 @@ class CLI:
                 pass
         else:
             if self.args.ai and self.game.current_player == self.ai.color:
-                move = self.ai.get_move(self.game.boards[-1])
+                move = self.ai.get_move(self.game.board)
                 # TODO error handling
                 print(self.game.move_str(move))
-                self.make_move(self.game.move_str(move))
+                self.make_move(move)
             else:
                 print('next:', self.game.current_player)
 
-    def print_board(self, board:Board=None, **kwargs):
+        if self.args.auto_save:
+            self.write_cache()
+
+    def print_board(self, board:'Board'=None, **kwargs):
         """Print a board to the screen. If none is given, print current board.
 
         Printing options that have been set in :data:`args` are respected.
@@ -207,6 +244,7 @@ class CLI:
         :param \**kwargs: all other keyword arguments are passed through to
             :meth:`.Board.print()`
         """
+        from .board import Black
         self.game.print_board(
                 board=board,
                 unicode=not self.args.ascii,
@@ -222,23 +260,125 @@ class CLI:
         """
         try:
             with open(self.args.match_file) as match_file:
-                rounds = match_file.read().split('\n')
-                return [move for round_ in rounds for move in round_.split(' ') if move]
+                return [move for round_ in match_file for move in round_.split()]
         except FileNotFoundError:
             return []
 
-    def write_match_file(self):
+    def load_game(self) -> 'Game':
+        """Set up the game from the match file, if any.
+
+        A cached game is used if the match file did not change since it was
+        cached. The change is detected by the file's modification time and
+        size, falling back to a content hash if those differ, so that merely
+        touched files don't trigger a replay.
+
+        :returns: the game with all moves of the match file played
+        """
+        import pickle
+        import hashlib
+        from .game import Game
+        if not self.args.match_file:
+            return Game([])
+        try:
+            stat = os.stat(self.args.match_file)
+        except FileNotFoundError:
+            return Game([])
+        if self.args.no_cache:
+            return Game(self.parse_match_file())
+
+        try:
+            with open(self.cache_path(), 'rb') as cache:
+                version, mtime_ns, size, digest, game = pickle.load(cache)
+            if version != CACHE_VERSION:
+                raise ValueError(f"cache version {version}")
+        except Exception:
+            # missing, corrupt or outdated cache, all treated as a miss
+            mtime_ns = size = digest = game = None
+        if game is not None and (stat.st_mtime_ns, stat.st_size) == (mtime_ns, size):
+            return game
+
+        with open(self.args.match_file, 'rb') as match_file:
+            file_digest = hashlib.sha1(match_file.read()).hexdigest()
+        if game is None or file_digest != digest:
+            game = Game(self.parse_match_file())
+        self.write_cache(game, stat, file_digest)
+        return game
+
+    def cache_path(self) -> str:
+        """:returns: the path of the cache file for the current match file"""
+        import hashlib
+        key = hashlib.sha1(os.path.abspath(self.args.match_file).encode()).hexdigest()
+        return os.path.join(CACHE_DIR, key+'.pickle')
+
+    def write_cache(self, game:'Game'=None, stat:os.stat_result=None, digest:str=None):
+        """Cache a game for the current match file. Failing to write the
+        cache is not an error.
+
+        :param game: the game to cache, defaults to the current game
+        :param stat: :py:func:`os.stat` result of the match file, read if
+            omitted
+        :param digest: sha1 hex digest of the match file, computed if omitted
+        """
+        if not self.args.match_file or self.args.no_cache:
+            return
+        import pickle
+        import hashlib
+        if game is None:
+            game = self.game
+        try:
+            if stat is None:
+                stat = os.stat(self.args.match_file)
+            if digest is None:
+                with open(self.args.match_file, 'rb') as match_file:
+                    digest = hashlib.sha1(match_file.read()).hexdigest()
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(self.cache_path(), 'wb') as cache:
+                pickle.dump((CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest, game), cache)
+        except OSError:
+            pass
+
+    def write_match_file(self, full:bool=False):
         """Write the game to the match file provided as commandline argument
         or set in interactive mode.
+
+        Only the moves made since the last write are appended, the file is
+        rewritten completely if moves have been undone, the game or match
+        file changed or `full` is given.
+
+        :param full: rewrite the whole match file
         """
-        with open(self.args.match_file, 'w') as match:
-            return match.write(str(self.game))
+        moves = self.game.moves
+        saved = self._saved_move_count
+        saved_for = (self.game, self.args.match_file, moves[saved-1]) \
+                if 0 < saved <= len(moves) else None
+        if (full or saved_for is None or self._saved_for is None
+                or any(a is not b for a, b in zip(saved_for, self._saved_for))):
+            with open(self.args.match_file, 'w') as match:
+                match.write(str(self.game))
+        elif saved < len(moves):
+            new = []
+            for n in range(saved, len(moves)):
+                san = self.game.move_str(moves[n])
+                if n % 2:
+                    new.append(f" {san}\n")
+                else:
+                    new.append(san if n+1 < len(moves) else san+'\n')
+            with open(self.args.match_file, 'r+b') as match:
+                # a trailing white move is continued on its line by black
+                match.seek(-1 if saved % 2 else 0, os.SEEK_END)
+                match.write(''.join(new).encode())
+        self._saved_move_count = len(moves)
+        self._saved_for = (self.game, self.args.match_file, moves[-1] if moves else None)
 
     def print_full_game(self):
-        """Print all boards of the game"""
-        self.game.boards[0].print()
+        """Print all boards of the game, or the ones kept if its history is
+        limited (see :class:`.Game`)"""
+        boards = iter(self.game.boards)
+        # the kept boards line up with the last moves
+        first = len(self.game.moves) - len(self.game.boards) + 1
+        next(boards).print()
         print()
-        for n, (board, move) in enumerate(zip(self.game.boards[1:], self.game.moves)):
+        for n, (board, move) in enumerate(zip(boards, self.game.moves[first:]), first):
             print(f"{n}. {move[0].color}: {self.game.move_str(move)}")
             self.print_board(board)
             print()
@@ -249,7 +389,10 @@ class CLI:
         :param move: either move string or tuple of (Piece source, Square target)
             See :meth:`.Game.make_move()` for details.
         """
-        self.game.make_move(move)
+        if isinstance(move, tuple):
+            self.game.make_move(*move)
+        else:
+            self.game.make_move(move)
         self.print_board()
         if self.args.auto_save:
             self.write_match_file()
@@ -265,39 +408,41 @@ class CLI:
         The special value :samp:`__break__` will break out of the loop.
         """
         # TODO :raises GameOverException:
+        import readline
 
         print("Type `help` for a list of available commands.")
+        ai_color = self.ai.color if self.args.ai else None
         while True:
-            try:
-                if self.args.ai:
-                    if self.game.current_player == self.ai.color:
-                        move = self.ai.get_move(self.game.boards[-1])
-                        # TODO error handling
-                        print(f"\nAI ({self.ai.color}): {self.game.move_str(move)}")
-                        self.make_move(self.game.move_str(move))
-                command_line = input(f'You ({self.game.current_player}): ')
-                parts = command_line.split(' ')
-
-                # special command to break out of the interactive loop without
-                # exiting the program. used for testing and debugging
-                if parts[0] == '__break__':
-                    raise BreakInteractiveException
-
-                run_command = getattr(self, 'cmd_'+parts[0])
-                run_command(*parts[1:])
-            except AttributeError:
+            if ai_color is not None and self.game.current_player == ai_color:
+                current_board = self.game.board
+                move = self.ai.get_move(current_board)
+                # TODO error handling
+                print(f"\nAI ({ai_color}): {self.game.move_str(move)}")
+                self.make_move(move)
+            command_line = input(f'You ({self.game.current_player}): ')
+            parts = command_line.split(' ')
+
+            # special command to break out of the interactive loop without
+            # exiting the program. used for testing and debugging
+            if parts[0] == '__break__':
+                raise BreakInteractiveException
+
+            run_command = self.commands.get(parts[0])
+            if run_command is None:
                 # no command of that name found, default to cmd_move
                 self.cmd_move(parts[0])
+            else:
+                run_command(*parts[1:])
 
     def cmd_help(self, *args):
         """help: Print this help"""
-        available_commands = [f for f in dir(self) if f.startswith('cmd_')]
-        helps = [getattr(self, f).__doc__ for f in available_commands]
+        helps = [command.__doc__ for command in self.commands.values()]
         print("Available commands:")
         print('  '+'\n  '.join(helps))
 
     def cmd_move(self, *args):
         """[move ]<move>: Make a <move> on the board: [<source_file>][<source_rank>]<piece><target_file><target_rank> (e.g. 'move d3Qe5' or 'a5')"""
+        from .exceptions import IllegalMoveError, MoveParseError, AmbigousMoveError
         try:
             self.make_move(args[0])
         except AmbigousMoveError:
@@ -310,10 +455,11 @@ class CLI:
 
     def cmd_show(self, *args):
         """show <file><rank>: highlight all possible moves for piece on square with file and rank (e.g. 'show a3')."""
+        from .board import Square
         try:
             file_, rank = args[0]
             position = Square(file_, int(rank))
-            board = self.game.boards[-1]
+            board = self.game.board
             possible_moves = board[position].possible_moves(board)
             # for debugging: show blocked legal moves instead of possible moves
             #possible_moves = [sq for sq, _ in board for p in board.pieces() if sq.blocked_by(position, p.position)]
@@ -329,7 +475,7 @@ class CLI:
             self.args.match_file = args[0]
         if self.args.match_file:
             self.args.auto_save = True
-            self.write_match_file()
+            self.write_match_file(full=True)
             print(f"Auto saving to `{self.args.match_file}`")
         else:
             print("No match file given")
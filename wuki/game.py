@@ -6,8 +6,8 @@ This module includes the :class:`Game` class, which describes the highest
 level of description for a game of chess.
 """
 
-from typing import Union, Tuple
-import re
+from typing import Union, Tuple, Set, List
+from collections import OrderedDict, deque
 
 from . import piece
 from .board import Color, White, Black, Square, Board
@@ -15,6 +15,81 @@ from .exceptions import WrongPlayerError, MoveParseError, AmbigousMoveError
 from .exceptions import CheckException, CheckmateException, DrawException
 
 
+#: Upper case letters of all kinds of pieces, as used in |SAN|_.
+_PIECE_LETTERS = ''.join(sorted(set(letter.upper() for letter in piece.piece_by_letter)))
+
+#: Files and ranks as they appear in |SAN|_.
+_FILES = "abcdefgh"
+_RANKS = "12345678"
+
+#: Kinds of pieces that are looked for a lot. Kinds of pieces have no state,
+#: so the initial pieces are set up with these instances and their kind can
+#: be compared by identity first.
+_KING = piece._KING
+_PAWNS = {White: piece.Pawn(White), Black: piece.Pawn(Black)}
+
+#: Castling moves and the file the king moves to, kingside and queenside.
+_CASTLE_TARGETS = {"0-0": 6, "0-0-0": 2}
+
+def _optional(move:str, i:int, chars:str) -> Tuple[int, ...]:
+    """Where parsing can continue after an optional character out of `chars`
+    at position `i`: after it first, if it's there, then without it.
+    """
+    if i < len(move) and move[i] in chars:
+        return (i+1, i)
+    return (i,)
+
+def _parse_san(move:str) -> Tuple[str, str, str, str, str]:
+    """Split a move in |SAN|_ into its parts, see :meth:`Game.parse_move`.
+
+    The optional parts are tried the same way a greedy regular expression
+    would, so e.g. in :samp:`b5` the :samp:`b` is the target file, not the
+    source file. Like :py:func:`re.match`, trailing characters (e.g. a
+    :samp:`+` for check) are ignored.
+
+    :returns: `source_file`, `source_rank` (`None` if absent), `piece`
+        letter (empty if absent), `target_file` and `target_rank`, or `None`
+        if the move isn't well formed
+    """
+    for i in _optional(move, 0, _FILES):
+        for j in _optional(move, i, _RANKS):
+            for k in _optional(move, j, _PIECE_LETTERS):
+                if k+1 < len(move) and move[k] in _FILES and move[k+1] in _RANKS:
+                    return move[:i] or None, move[i:j] or None, move[j:k], move[k], move[k+1]
+    return None
+
+def _split_move(move:str) -> Tuple[str, str, str, str, str]:
+    """Split a move in |SAN|_ into its parts like :func:`_parse_san`.
+
+    Fully qualified moves like :samp:`e2Pe4`, as written to match files,
+    don't need to be scanned for optional parts.
+    """
+    if (len(move) == 5 and move[0] in _FILES and move[1] in _RANKS
+            and move[2] in _PIECE_LETTERS and move[3] in _FILES and move[4] in _RANKS):
+        return move[0], move[1], move[2], move[3], move[4]
+    return _parse_san(move)
+
+#: Kinds of the pieces on the home rank, from file a to h.
+_HOME_RANK = (piece.Rook(), piece.Knight(), piece.Bishop(), piece.Queen(),
+              _KING, piece.Bishop(), piece.Knight(), piece.Rook())
+
+def _initial_pieces():
+    """The pieces in their starting position."""
+    sides = ((White, 1, +1), (Black, 8, -1))
+    return tuple(
+        [piece.Piece(kind, color, Square(file_, row))
+            for color, row, _ in sides
+            for file_, kind in zip(_FILES, _HOME_RANK)]
+        + [piece.Piece(_PAWNS[color], color, Square(file_, row+direction))
+            for color, row, direction in sides
+            for file_ in _FILES])
+
+#: The pieces every game starts with. Pieces are never moved in place
+#: (:meth:`.piece.Piece.move_to` returns a new one), so all games can share
+#: them, but every game gets its own :class:`.Board` as boards can be modified.
+_INITIAL_PIECES = _initial_pieces()
+
+
 class Game:
     """Holds all information about a game.
 
@@ -28,34 +103,35 @@ class Game:
     #: In chess, this is white.
     FIRST_PLAYER = White
 
-    def __init__(self, moves):
+    #: :type: int
+    #:
+    #: How many board positions :meth:`parse_move` remembers the source
+    #: pieces of moves for, the least recently used ones are forgotten first.
+    SOURCE_CACHE_SIZE = 2**20
+
+    def __init__(self, moves, history:int=None):
         """Create a game from an array of |SAN|_ moves
 
         :param List[str] moves: list of strings with single moves in |SAN|_
             fromat
+        :param history: how many board positions to keep, including the
+            current one. Only that many moves minus one can be undone.
+            Defaults to all of them.
 
         .. automethod:: __len__
         .. automethod:: __str__
         """
-
-        initial_pieces = []
-        for color, row, direction in zip([White, Black], [1, 8], [+1, -1]):
-            initial_pieces.extend([
-                piece.Piece(piece.Rook(),   color, Square('a', row)),
-                piece.Piece(piece.Knight(), color, Square('b', row)),
-                piece.Piece(piece.Bishop(), color, Square('c', row)),
-                piece.Piece(piece.King(),   color, Square('e', row)),
-                piece.Piece(piece.Queen(),  color, Square('d', row)),
-                piece.Piece(piece.Bishop(), color, Square('f', row)),
-                piece.Piece(piece.Knight(), color, Square('g', row)),
-                piece.Piece(piece.Rook(),   color, Square('h', row)),
-            ])
-            initial_pieces.extend([piece.Piece(piece.Pawn(color), color, Square(col, row+direction)) for col in "abcdefgh"])
         #: :type: List[Board]
         #:
         #: The list of all board positions that have been played in this game,
-        #: in chronological order.
-        self.boards = [Board(initial_pieces)]
+        #: in chronological order. A :class:`collections.deque` of the last
+        #: ones if the `history` is limited. Only with an unlimited history
+        #: is :code:`boards[0]` the starting position, can the boards be
+        #: sliced and does :code:`boards[n+1]` follow :code:`moves[n]`.
+        #: Otherwise they line up with the last :code:`len(boards)-1` moves.
+        self.boards = [Board(_INITIAL_PIECES)]
+        if history is not None:
+            self.boards = deque(self.boards, maxlen=history)
 
         #: :type: Color
         #:
@@ -66,8 +142,41 @@ class Game:
         #:
         #: The moves that have been played, in chronological order.
         self.moves = list()
-        for move in moves:
-            self.make_move(move)
+
+        #: :type: Color
+        #:
+        #: The player that is in check on the current board, `None` if
+        #: neither is.
+        self.check = None
+
+        # |SAN| of the first `_san_count` moves as returned by __str__(),
+        # extended when new moves have been made
+        self._san_cache = ''
+        self._san_count = 0
+
+        # source squares of moves whose source piece had to be inferred, by
+        # board position (see Board._hash) and move, see parse_move()
+        self._source_cache = OrderedDict()
+        # split up all moves first, so that a malformed one is reported
+        # before replaying the ones before it
+        parsed = [(move, None if move in _CASTLE_TARGETS else _split_move(move)) for move in moves]
+        for move, parts in parsed:
+            if parts is None and move not in _CASTLE_TARGETS:
+                raise MoveParseError('Wrong move format', move)
+        for move, parts in parsed:
+            if parts is None:
+                self.make_move(move)
+            else:
+                self.make_move(*self._resolve_move(move, parts, self.current_player, self.board))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_source_cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._source_cache = OrderedDict()
 
     def __repr__(self):
         return f"<Game moves={len(self.moves)} current_player={self.current_player}>"
@@ -81,27 +190,30 @@ class Game:
         :returns: a string in |SAN|_ describing the move
         """
         piece_, target = move
-        if piece_.piece == piece.King():
+        if piece_.piece_type is piece.King:
             if piece_.position.x - target.x == 2:
                 # queenside
                 return '0-0-0'
             elif piece_.position.x - target.x == -2:
                 # kingside
                 return '0-0'
-        return '{}{}{}'.format(piece_.position, piece_.letter.upper(), target)
+        return f"{piece_.position}{piece_.letter_upper}{target}"
 
     def __str__(self) -> str:
         """:returns: |SAN|_ of the whole game."""
-        moves = [self.move_str(m) for m in self.moves]
-        # unfortunately, this does not output a single white move
-        #return '\n'.join(w+' '+b for w, b in zip(moves[0::2], moves[1::2]))+'\n'
-        rounds = []
-        for i in range(0,len(moves),2):
-            round_ = moves[i]
-            if i+1 < len(moves):
-                round_ += ' '+moves[i+1]
-            rounds.append(round_)
-        return '\n'.join(rounds)+'\n'
+        for n in range(self._san_count, len(self.moves)):
+            if n % 2:
+                # black's move completes the round started by white
+                self._san_cache = f"{self._san_cache[:-1]} {self.move_str(self.moves[n])}\n"
+            else:
+                self._san_cache += self.move_str(self.moves[n])+'\n'
+        self._san_count = len(self.moves)
+        return self._san_cache or '\n'
+
+    @property
+    def board(self) -> Board:
+        """The current board position, the last of :attr:`boards`."""
+        return self.boards[-1]
 
     def __len__(self) -> int:
         """:returns: The length of the game is the number of moves that have been played."""
@@ -135,63 +247,96 @@ class Game:
         if current_player is None:
             current_player = self.current_player
         if board is None:
-            board = self.boards[-1]
+            board = self.board
 
         # treat castling separately
-        if "0-" in move:
+        castle_x = _CASTLE_TARGETS.get(move)
+        if castle_x is not None:
             y = current_player.home_y
             king = board[Square(4,y)]
-
-            if move == "0-0":
-                # kingside
-                target = Square(6,y)
-            elif move == "0-0-0":
-                # queenside
-                target = Square(2,y)
-
+            target = Square(castle_x,y)
             if target in king.possible_moves(board):
                 return king, target
             else:
                 raise MoveParseError("Castling not possible", move)
 
-        piece_letters = set(p.letter.upper() for p in self.boards[0].pieces())
-        move_re = ( "(?P<source_file>[a-h])?"        # source file/col  a
-                    "(?P<source_rank>[1-8])?"        # source rank/row  5
-                    f"(?P<piece>[{piece_letters}]?)" # piece letter     Q
-                    "(?P<target_file>[a-h])"         # target file/col  a
-                    "(?P<target_rank>[1-8])"         # target rank/row  9
-                    )
-        try:
-            matches = re.match(move_re, move).groupdict()
-        except:
+        parts = _split_move(move)
+        if parts is None:
             raise MoveParseError('Wrong move format', move)
-        piece_id = matches['piece'] if matches['piece'] else ('P' if current_player is White else 'p')
-        target = Square(matches['target_file'], int(matches['target_rank']))
-        if ('source_file' in matches and matches['source_file']
-            and 'source_rank' in matches and matches['source_rank']):
-            source = Square(matches['source_file'], int(matches['source_rank']))
-            piece_ = board[source]
+        return self._resolve_move(move, parts, current_player, board)
+
+    def _resolve_move(self, move:str, parts:Tuple[str, str, str, str, str], current_player:Color, board:Board) -> Tuple[piece.Piece, Square]:
+        """Find the source piece and target square of a move that has
+        already been split up by :func:`_split_move`, see :meth:`parse_move`.
+        """
+        source_file, source_rank, piece_id, target_file, target_rank = parts
+        if not piece_id:
+            piece_id = 'P' if current_player is White else 'p'
+        target = Square(target_file, int(target_rank))
+        if source_file and source_rank:
+            # fully qualified moves like 'e2Pe4', as written to match files,
+            # name their source square, no need to infer the source piece
+            source = Square(source_file, int(source_rank))
+            piece_ = self._piece_at(board, source, move)
         else:
-            possible_pieces = board.pieces(kind=piece.piece_by_letter[piece_id], color=current_player)
-            #print({p: p.possible_moves(board) for p in possible_pieces})
-            possible_pieces = [p for p in possible_pieces if target in p.possible_moves(board=board)]
-            if 'source_file' in matches and matches['source_file']:
-                possible_pieces = [p for p in possible_pieces if p.position.file == matches['source_file']]
-            if 'source_rank' in matches and matches['source_rank']:
-                possible_pieces = [p for p in possible_pieces if p.position.rank == int(matches['source_rank'])]
-            possible_pieces = list(possible_pieces)
+            if piece_id.upper() == _KING.letter:
+                # castling rights are not part of the board's hash
+                possible_pieces = self._source_pieces(board, piece_id, current_player, source_file, source_rank, target)
+            else:
+                key = (board._hash, current_player.color, piece_id, source_file, source_rank, target)
+                sources = self._source_cache.get(key)
+                if sources is None:
+                    sources = [p.position for p in self._source_pieces(board, piece_id, current_player, source_file, source_rank, target)]
+                    self._source_cache[key] = sources
+                    while len(self._source_cache) > self.SOURCE_CACHE_SIZE:
+                        self._source_cache.popitem(last=False)
+                else:
+                    self._source_cache.move_to_end(key)
+                possible_pieces = [board[source] for source in sources]
 
             if len(possible_pieces) == 1:
                 piece_ = possible_pieces[0]
             else:
                 raise AmbigousMoveError('Source piece inference not possible', move)
-        if not piece_id.upper() == piece_.letter.upper():
-            raise MoveParseError(f"Specified source piece and piece on that square do not match (is {piece_.letter.upper()})", move)
+        if not piece_id.upper() == piece_.letter_upper:
+            raise MoveParseError(f"Specified source piece and piece on that square do not match (is {piece_.letter_upper})", move)
         if not current_player == piece_.color:
             print(repr(piece_))
             raise MoveParseError("Color of piece at source square does not match current player", move)
         return piece_, target
 
+    @staticmethod
+    def _source_pieces(board:Board, piece_id:str, player:Color, source_file:str, source_rank:str, target:Square) -> List[piece.Piece]:
+        """The pieces of a kind that could move to the target square of a
+        move, narrowed down by the source file and rank if given. Stops at
+        the second one found, as the move is ambiguous then.
+        """
+        source_rank = int(source_rank) if source_rank else None
+        found = []
+        for p in board.pieces(kind=piece.piece_by_letter[piece_id], color=player):
+            # check the source hints first, they are cheap compared to
+            # generating the possible moves of the candidate
+            if source_file and p.position.file != source_file:
+                continue
+            if source_rank and p.position.rank != source_rank:
+                continue
+            if target in p.possible_moves(board=board):
+                found.append(p)
+                if len(found) > 1:
+                    break
+        return found
+
+    @staticmethod
+    def _piece_at(board:Board, source:Square, move:str) -> piece.Piece:
+        """The piece on the source square named by a move.
+
+        :raises MoveParseError: if there is no piece on the square
+        """
+        try:
+            return board[source]
+        except KeyError:
+            raise MoveParseError(f"No piece on source square {source}", move)
+
     def make_move(self, piece:Union[piece.Piece,str], target:Square=None):
         """Move on the current board.
 
@@ -212,15 +357,14 @@ class Game:
             raise ValueError("Either move is passed as string or piece and target have to be supplied")
         if piece.color != self.current_player:
             raise WrongPlayerError(f"current player: {self.current_player}")
-        # TODO this is incredibly slow, maybe not do this every round?
-        #try:
-        #    self.check_state()
-        #except CheckException:
-        #    # a check does not prevent a new move to be made
-        #    pass
-        self.boards.append(self.boards[-1].make_move(piece, target))
+        self.boards.append(self.board.make_move(piece, target))
         self.moves.append((piece, target))
         self.current_player = ~self.current_player
+        # Only the moved pieces can give check, either directly or by
+        # uncovering a ray, so there's no need to generate all moves.
+        # TODO also detect checkmate and stalemate (see check_state()),
+        # which still requires all possible moves
+        self.check = self._in_check(self.current_player, through=self.changed_squares())
 
     def undo(self, n:int=1):
         """Undo the last move
@@ -228,9 +372,37 @@ class Game:
         :param n: how many moves to undo
         """
         if len(self.boards) > n and len(self.moves) > n-1:
-            del self.boards[-n:]
+            for _ in range(n):
+                self.boards.pop()
             del self.moves[-n:]
-            self.current_player = self.current_player if n%2==0 else ~self.current_player
+            if n % 2:
+                self.current_player = ~self.current_player
+            self.check = self._in_check(self.current_player)
+            self._san_cache = ''
+            self._san_count = 0
+
+    def changed_squares(self) -> Set[Square]:
+        """:returns: The squares whose occupation changed with the last move:
+            its source and target square and where the rook came from and
+            went to when castling.
+        """
+        piece_, target = self.moves[-1]
+        source = piece_.position
+        affected = {source, target}
+        if (piece_.piece_type is piece.King) and abs(source.x - target.x) == 2:
+            kingside = target.x > source.x
+            affected.add(Square(7 if kingside else 0, target.y))
+            affected.add(Square(5 if kingside else 3, target.y))
+        return affected
+
+    def _in_check(self, player:Color, through:Set[Square]=None) -> Color:
+        """:returns: `player` if it is in check on the current board, `None`
+            otherwise (or if it has no King, e.g. on a test board).
+        """
+        board = self.board
+        if board.pieces(kind=_KING, color=player) and board.is_check(player, through=through):
+            return player
+        return None
 
     def print_board(self, board:Board=None, **kwargs):
         """Print a board or the current board.
@@ -240,7 +412,7 @@ class Game:
             :meth:`.Board.print()`
         """
         if board is None:
-            board = self.boards[-1]
+            board = self.board
         board.print(**kwargs)
 
     def check_state(self, player:Color=None):
@@ -261,7 +433,7 @@ class Game:
         """
         if player is None:
             player = self.current_player
-        current_board = self.boards[-1]
+        current_board = self.board
         if current_board.is_stalemate(player):
             raise DrawException(reason=f'stalemate {player}')
         # TODO a lot of other reasons for a draw
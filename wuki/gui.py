@@ -21,10 +21,97 @@ If you want to cancel the move and select another piece, just click on the
 selected piece again to deselect it.
 The last move the AI made is highlighted in blue.
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import wx
 from .game import Game
 from .board import BOARD_LEN, Square, Black, White
 from . import ai
+from .piece import piece_by_letter
+from .exceptions import GameOverException, CheckException
+
+class BoardCanvas(wx.Panel):
+    """Draws the board with its coordinates and pieces on a single panel and
+    reports clicks on its squares.
+    """
+
+    def __init__(self, parent, gui):
+        """
+        :param parent: the parent window
+        :param GUI gui: the window whose game is drawn and whose
+            :meth:`GUI.OnClick` handles clicks
+        """
+        super(BoardCanvas, self).__init__(parent)
+        self.gui = gui
+        # everything is painted in OnPaint, through a buffer against flicker
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.brushes = {colour: wx.Brush(colour) for colour in
+                        [gui.ColourBgWhite, gui.ColourBgBlack, gui.ColourBgHighlight, gui.ColourBgHist]}
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_SIZE, self.OnSize)
+        self.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
+
+    def CellSize(self):
+        """The side length of a square in pixels. The board is surrounded by
+        a row or column of labels on each side."""
+        client = self.GetClientSize()
+        return max(min(client.width, client.height) // (BOARD_LEN+2), 1)
+
+    def SquareRect(self, square):
+        """The area of the canvas a square is drawn in.
+
+        :param Square square: the square on the board
+        """
+        size = self.CellSize()
+        return wx.Rect((square.x+1)*size, (BOARD_LEN-square.y)*size, size, size)
+
+    def OnPaint(self, event):
+        """Draw the labels, squares and pieces."""
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        gui = self.gui
+        board = gui.game.board
+        size = self.CellSize()
+        font = self.GetFont()
+        font.SetPixelSize(wx.Size(0, size//3))
+        dc.SetFont(font)
+        dc.SetTextForeground(self.GetForegroundColour())
+        for i in range(BOARD_LEN):
+            for label, column, row in [("abcdefgh"[i], i+1, 0), ("abcdefgh"[i], i+1, BOARD_LEN+1),
+                                       (str(i+1), 0, BOARD_LEN-i), (str(i+1), BOARD_LEN+1, BOARD_LEN-i)]:
+                dc.DrawLabel(label, wx.Rect(column*size, row*size, size, size), wx.ALIGN_CENTER)
+
+        font.SetPixelSize(wx.Size(0, size*2//3))
+        dc.SetFont(font)
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        for square, colour in gui.square_colours.items():
+            rect = self.SquareRect(square)
+            if square == gui.move_source or square in gui.highlighted:
+                colour = gui.ColourBgHighlight
+            elif square in gui.last_move_squares:
+                colour = gui.ColourBgHist
+            dc.SetBrush(self.brushes[colour])
+            dc.DrawRectangle(rect)
+            if square in board:
+                label, piece_colour = gui.piece_styles[board[square].letter]
+                dc.SetTextForeground(piece_colour)
+                dc.DrawLabel(label, rect, wx.ALIGN_CENTER)
+
+    def OnSize(self, event):
+        """All squares change their size, redraw everything."""
+        self.Refresh()
+        event.Skip()
+
+    def OnLeftDown(self, event):
+        """Pass clicks on a square on to :meth:`GUI.OnClick`."""
+        size = self.CellSize()
+        position = event.GetPosition()
+        file_, rank = position.x//size - 1, BOARD_LEN - position.y//size
+        if 0 <= file_ < BOARD_LEN and 0 <= rank < BOARD_LEN:
+            self.gui.OnClick(Square(file_, rank))
+
 
 class GUI(wx.Frame):
     ColourFgWhite = wx.Colour(255,255,255)
@@ -38,127 +125,113 @@ class GUI(wx.Frame):
         """Setup a Game, an AI and render the board."""
         super(GUI, self).__init__(parent, title="Wuki Chess", size=(512,512))
         self.ai = ai.WukiAI(Black)
-        self.buttons = {}
-        self.highlighted = []
+        # squares the selected piece can move to
+        self.highlighted = set()
         self.last_move_squares = []
         self.move_source = None
-        self.game = Game([])
+        # whether the AI is thinking, the board takes no moves meanwhile
+        self.thinking = False
+        # nesting level of batch_updates() and the squares to redraw after it
+        self._batching = 0
+        self._dirty_squares = set()
+        # only the current board is shown, keep one more for undoing a move
+        self.game = Game([], history=2)
+        # label and foreground color of the pieces, by piece letter
+        self.piece_styles = {}
+        for kind in piece_by_letter.values():
+            self.piece_styles[kind.letter.upper()] = (kind.symbol[Black], self.ColourFgWhite)
+            self.piece_styles[kind.letter.lower()] = (kind.symbol[Black], self.ColourFgBlack)
+        # background color of every square on the board
+        self.square_colours = {}
+        for rank in range(BOARD_LEN):
+            for file_ in range(BOARD_LEN):
+                position = Square(file_, rank)
+                self.square_colours[position] = self.ColourBgWhite if position.color() == White else self.ColourBgBlack
+        # the AI thinks in the background, so the GUI stays responsive
+        self.ai_executor = ThreadPoolExecutor(max_workers=1)
         self.SetupBoard()
 
     def SetupBoard(self):
-        """Render buttons forming the current board position"""
-        board = self.game.boards[-1]
-        panel = wx.Panel(self)
-        grid = wx.GridSizer(BOARD_LEN+2, BOARD_LEN+2, 0, 0)
+        """Create the canvas the board is drawn on"""
+        self.canvas = BoardCanvas(self, self)
 
-        for file_ in " abcdefgh ":
-            grid.Add(wx.StaticText(panel, label=file_), 0, wx.ALIGN_CENTER)
+    def UpdateSquares(self, squares):
+        """Redraw some squares of the board. Within :meth:`batch_updates`,
+        they are redrawn at its end.
 
-        for rank in reversed(range(BOARD_LEN)):
-            grid.Add(wx.StaticText(panel, label=str(rank+1)), 0, wx.ALIGN_CENTER)
-            for file_ in range(BOARD_LEN):
-                position = Square(file_, rank)
-                button = wx.ToggleButton(panel, label='')
-                button.Bind(wx.EVT_TOGGLEBUTTON, self.OnClick)
-                button.square = position
-                font = button.GetFont()
-                font.Scale(3)
-                button.SetFont(font)
-                square_color = self.ColourBgWhite if position.color() == White else self.ColourBgBlack
-                button.SetBackgroundColour(square_color)
-                button.SetToolTip(wx.ToolTip(str(position)))
-                self.buttons[position] = button
-                self.UpdateButton(position)
-                grid.Add(button, 0, wx.EXPAND)
-            grid.Add(wx.StaticText(panel, label=str(rank+1)), 0, wx.ALIGN_CENTER)
-
-        for file_ in " abcdefgh ":
-            grid.Add(wx.StaticText(panel, label=file_), 0, wx.ALIGN_CENTER)
-
-        panel.SetSizer(grid)
-
-    def UpdateButton(self, position):
-        """Update a buttons label (piece) and colors based on its position
-        
-        :param Square position: the game square the button represents
+        :param squares: the Squares that changed
         """
-        board = self.game.boards[-1]
-        button = self.buttons[position]
-        button.SetValue(False)
-        if position in board:
-            piece = board[position]
-            button.SetLabel(piece.piece.symbol[Black])
-            piece_color = self.ColourFgWhite if piece.color == White else self.ColourFgBlack
-            button.SetForegroundColour(piece_color)
-            if piece.color != self.game.current_player:
-                button.Disable()
-        else:
-            button.SetLabel('')
-            button.Disable()
+        if self._batching:
+            self._dirty_squares.update(squares)
+            return
+        for square in squares:
+            self.canvas.RefreshRect(self.canvas.SquareRect(square))
+
+    @contextmanager
+    def batch_updates(self):
+        """Context manager that collects the squares updated within it and
+        redraws the area covering all of them once at its end. Can be
+        nested, the outermost one redraws.
+        """
+        self._batching += 1
+        try:
+            yield
+        finally:
+            self._batching -= 1
+            if not self._batching and self._dirty_squares:
+                squares = iter(self._dirty_squares)
+                area = self.canvas.SquareRect(next(squares))
+                for square in squares:
+                    area.Union(self.canvas.SquareRect(square))
+                self._dirty_squares = set()
+                self.canvas.RefreshRect(area)
 
     def UpdateBoard(self):
-        """Call UpdateButton on all self.buttons"""
-        for button in self.buttons:
-            self.UpdateButton(button)
+        """Redraw the whole board. After a move, only the squares in
+        :meth:`.Game.changed_squares` need updating, see :meth:`UpdateSquares`."""
+        self.canvas.Refresh()
 
-    def ResetButtonBg(self, position):
-        """Reset a buttons background color, i.e. remove any highlighting and
-        set to the color of the square it represents
+    def OnClick(self, square):
+        """Handle a click on a square of the board. Either selects or
+        deselects a piece for moving or selects its target and performs the
+        move.
 
-        :param Square position: the game square the button represents
+        :param Square square: the square that was clicked
         """
-        square_color = self.ColourBgWhite if position.color() == White else self.ColourBgBlack
-        self.buttons[position].SetBackgroundColour(square_color)
+        if self.thinking:
+            return
+        board = self.game.board
 
-    def OnClick(self, event):
-        """Event handler for board button press. Either selects or deselects
-        a piece for moving or selects its target and performs the move.
-        """
-        button = event.GetEventObject()
-        board = self.game.boards[-1]
-
-        if button.GetValue():
-            # button is pressed for the first time: source or target selection
-            if self.move_source:
-                # source piece already selected, this button is target, make move
-                source = board[self.move_source]
-                target = button.square
-                self.MakeMove(source, target)
-                self.move_source = None
-                # TODO UI needs to update _before_ AI starts thinking
-                self.MakeAIMove()
-            else:
-                # no source piece selected yet, this button is source
-                self.move_source = button.square
-                for possible_move in board[self.move_source].possible_moves(board):
-                    self.highlighted.append(self.buttons[possible_move])
-                for b in self.buttons.values():
-                    b.Disable()
-                button.Enable()
-                self.Highlight()
-        else:
-            # pressed same button again, deselecting source piece
-            self.move_source = None
+        if self.move_source is None:
+            # no source piece selected yet, a piece of the current player is
+            # the source
+            if square in board and board[square].color == self.game.current_player:
+                self.move_source = square
+                self.highlighted = set(board[square].possible_moves(board))
+                self.UpdateSquares(self.highlighted | {square})
+        elif square == self.move_source:
+            # clicked the source piece again, deselecting it
             self.Highlight(False)
-            self.EnablePlayer()
+        elif square in self.highlighted:
+            # source piece already selected, this is the target, make move
+            source = board[self.move_source]
+            self.MakeMove(source, square)
+            self.MakeAIMove()
 
     def Highlight(self, highlight=True):
-        """Highlight all squares that are in self.highlighted and
+        """Redraw the squares in self.highlighted and
         self.last_move_squares.
 
-        :param highlight: bool wether to enable or clear the highlighting
-            (only affects self.highlighted)
+        :param highlight: bool wether to keep or clear the highlighting of
+            the selected piece and its moves (only affects self.highlighted)
         """
-        for square in self.last_move_squares:
-            self.buttons[square].SetBackgroundColour(self.ColourBgHist)
-        for button in self.highlighted:
-            if highlight:
-                button.Enable()
-                button.SetBackgroundColour(self.ColourBgHighlight)
-            else:
-                button.Disable()
-                self.ResetButtonBg(button.square)
-                self.highlighted = []
+        squares = self.highlighted | set(self.last_move_squares)
+        if self.move_source is not None:
+            squares.add(self.move_source)
+        if not highlight:
+            self.highlighted = set()
+            self.move_source = None
+        self.UpdateSquares(squares)
 
     def MakeMove(self, source, target):
         """Make a move and update the board state accordingly
@@ -166,34 +239,64 @@ class GUI(wx.Frame):
         :param Piece source: the source Piece
         :param Square target: the target Square
         """
-        self.game.make_move(source, target)
-        self.Highlight(False)
-        self.EnablePlayer()
-        self.UpdateBoard()
+        with self.batch_updates():
+            self.game.make_move(source, target)
+            self.Highlight(False)
+            # only the squares of the move (and the rook's when castling) need
+            # to be drawn again
+            self.UpdateSquares(self.game.changed_squares())
 
     def MakeAIMove(self):
-        """Let the AI make a move"""
-        piece, target = self.ai.get_move(self.game.boards[-1])
-        self.MakeMove(piece, target)
-        for s in self.last_move_squares:
-            self.ResetButtonBg(s)
-        self.last_move_squares = [piece.position, target]
-        self.Highlight()
-
-    def EnablePlayer(self, player=None):
-        """Enable all buttons for the current or provided player and disable
-        all the opponent's ones
-
-        :param player: the player for which to enable the buttons
+        """Let the AI think of a move in the background, the board takes no
+        moves until :meth:`OnAIMove` makes it.
+        """
+        self.thinking = True
+        # the AI tries out moves on the board it gets, so it needs its own
+        future = self.ai_executor.submit(self.ai.get_move, self.game.board.copy())
+        future.add_done_callback(self.OnAIDone)
+
+    def OnAIDone(self, future):
+        """Hand the AI's move or its failure over to the main thread, this is
+        called on the AI's thread.
+
+        :param Future future: the AI's finished :meth:`.WukiAI.get_move`
+        """
+        error = future.exception()
+        if error is None:
+            wx.CallAfter(self.OnAIMove, *future.result())
+        else:
+            wx.CallAfter(self.OnAIError, error)
+
+    def OnAIMove(self, piece, target):
+        """Make the move the AI came up with and highlight it.
+
+        :param Piece piece: the source Piece
+        :param Square target: the target Square
+        """
+        try:
+            with self.batch_updates():
+                self.MakeMove(piece, target)
+                self.UpdateSquares(self.last_move_squares)
+                self.last_move_squares = [piece.position, target]
+                self.Highlight()
+        finally:
+            self.thinking = False
+
+    def OnAIError(self, error):
+        """Report why the AI couldn't come up with a move, usually because
+        the game is over.
+
+        :param Exception error: what the AI raised
         """
-        if player is None:
-            player = self.game.current_player
-        board = self.game.boards[-1]
-        for position, button in self.buttons.items():
-            if position in board and board[position].color == player:
-                button.Enable()
-            else:
-                button.Disable()
+        self.thinking = False
+        try:
+            self.game.check_state()
+        except GameOverException as game_over:
+            wx.MessageBox(f"Game over: {game_over.reason}", "Wuki Chess")
+            return
+        except CheckException:
+            pass
+        wx.MessageBox(f"The AI could not make a move: {error!r}", "Wuki Chess", wx.OK | wx.ICON_ERROR)
 
 if __name__ == "__main__":
     app = wx.App()
@@ -1,6 +1,39 @@
-from .board import White, Black, Square, within_board
+from typing import Tuple
+from collections import OrderedDict
+
+from .board import White, Black, Square
+from .board import BOARD_LEN, _ORTHOGONAL_RAYS, _DIAGONAL_RAYS
+from .board import _KING_ATTACKS, _KNIGHT_ATTACKS, _PAWN_ATTACKS
+from .board import _RAY_MASKS, _ray_attacks, _bitboard, _squares
 from .exceptions import IllegalMoveError
 
+#: :type: int
+#:
+#: For how many pieces in board positions :meth:`Piece.possible_moves` are
+#: remembered across boards, the least recently used ones are forgotten first.
+POSSIBLE_MOVES_CACHE_SIZE = 2**18
+
+# possible moves by board position hash (see Board._hash), castling rights (for
+# Kings), and piece, see Piece.possible_moves()
+_possible_moves = OrderedDict()
+
+def _ray_moves(rays) -> Tuple[int, ...]:
+    """Bitboards of the squares along some rays from every square."""
+    return tuple(sum(_RAY_MASKS[ray][index] for ray in rays) for index in range(BOARD_LEN**2))
+
+# squares the kinds of pieces move to from every square on an empty board, by
+# letter and Square.index. For pawns, the squares they attack. See the
+# legal_moves() methods.
+_LEGAL_MOVES = {letter: tuple(frozenset(_squares(moves)) for moves in bitboards) for letter, bitboards in [
+    ('K', _KING_ATTACKS),
+    ('Q', _ray_moves(_ORTHOGONAL_RAYS + _DIAGONAL_RAYS)),
+    ('R', _ray_moves(_ORTHOGONAL_RAYS)),
+    ('B', _ray_moves(_DIAGONAL_RAYS)),
+    ('N', _KNIGHT_ATTACKS),
+    ('P', _PAWN_ATTACKS[White.color]),
+    ('p', _PAWN_ATTACKS[Black.color]),
+    ]}
+
 class AbstractPiece:
     """General type of a piece"""
     def __init__(self):
@@ -10,8 +43,8 @@ class AbstractPiece:
         self.name = None # pragma: no cover
         # one letter identifier used in PGN or SAN
         self.letter = None # pragma: no cover
-        # unicode symbol for the piece in either color
-        self.symbol = {White:None, Black:None} # pragma: no cover
+        # unicode symbol for the piece in either color, indexed by the color
+        self.symbol = (None, None) # pragma: no cover
 
     def __str__(self):
         return self.name
@@ -58,9 +91,13 @@ class Piece(AbstractPiece):
             (important for castling)
         """
         self.piece = piece
+        # the class of the kind of piece, cheaper to compare than instances
+        self.piece_type = type(piece)
         self.name = piece.name
         self.color = color
-        self.letter = piece.letter.upper() if color is White else piece.letter.lower()
+        # the letter as used in SAN, regardless of color
+        self.letter_upper = piece.letter.upper()
+        self.letter = self.letter_upper if color is White else piece.letter.lower()
         self.symbol = piece.symbol[color]
         if not isinstance(position, Square):
             position = Square(position)
@@ -98,75 +135,51 @@ class Piece(AbstractPiece):
         :param Board board: the board on which the piece needs to find its
             possible moves
 
-        :returns moves: a list of Sqaures that the piece could move to
+        The moves are cached on the board until it is changed, and by board
+        position (see :attr:`POSSIBLE_MOVES_CACHE_SIZE`).
+
+        :returns moves: a set of Sqaures that the piece could move to
         """
-        mover = self.position
-        legal_moves = self.piece.legal_moves(self.position, board)
-        possible_moves = legal_moves.copy()
-        # own pieces cannot by captured
-        possible_moves = set([s for s in possible_moves if (s in board and board[s].color is not self.color) or s not in board])
-        if self == Knight():
-            # Knights don't get blocked by other pieces
-            pass
-        elif self == King():
-            # Kings cannot move themselves into check
-            squares_in_check = [sq for p, sq in board.possible_moves(~self.color, give_check=True)]
-            for square_in_check in squares_in_check:
-                possible_moves.discard(square_in_check)
-            try:
-                # treat opponent King separately to avoid infinite recursion
-                # use opponent's King's `.legal_moves` instead of possible_moves
-                # to avoid recursion. Wether blocked or not, two Kings can
-                # never sit adjacent.
-                opponent_king = next(iter(board.pieces(kind=King(), color=~self.color)))
-                for square_in_check in opponent_king.piece.legal_moves(opponent_king.position, board):
-                    possible_moves.discard(square_in_check)
-            except:
-                # Board has no opponent King. While not being legal, this can
-                # happend for debug/testing purposes and we don't care
-                pass
-            # castling
-            if not self.touched and self.position == (4, self.color.home_y):
-                for rook in board.pieces(kind=Rook(), color=self.color):
-                    if (not rook.touched
-                        and (rook.position == (0, self.color.home_y)
-                          or rook.position == (7, self.color.home_y))):
-                        # we can only castle if neither the king nor the rook
-                        # have been touched before. sitting in the original
-                        # position is not enough
-
-                        # wether the castling is queen or kingside
-                        direction = 1 if rook.position.x > self.position.x else -1
-                        # check if any pieces are between the rook and the king
-                        blocked = False
-                        for dist in range(1,int(self.position.dist(rook.position))):
-                            blocked |= self.position + (dist*direction,0) in board
-                        # check if king is currently under check or moves
-                        # through check
-                        checked = False
-                        for dist in [0,1,2]:
-                            checked |= self.position + (dist*direction,0) in squares_in_check
-                        if not blocked and not checked:
-                            castling_target = self.position + (2*direction,0)
-                            possible_moves.add(castling_target)
-        elif self == Pawn(self.color):
-            # Pawns cannot capture where they walk, opponent pieces block them
-            one_step = self.position + (0, 1*self.color.direction)
-            two_step = self.position + (0, 2*self.color.direction)
-            if one_step in board:
-                possible_moves.discard(one_step)
-                # if square in front is taken, pawn cann also not walk two steps
-                possible_moves.discard(two_step)
-            if two_step in board:
-                possible_moves.discard(two_step)
+        if self.piece_type is King:
+            # castling depends on whether the king and rooks have been
+            # touched, which can be changed without changing the board
+            key = (self, self.touched, frozenset(rook.position for rook in board.pieces(kind=_ROOK, color=self.color) if not rook.touched))
         else:
-            # remove orthogonally and diagonally blocked squares for all other
-            # pieces, opponent pieces block, but can be captured
-            for blocker in [s for s in legal_moves if s in board]:
-                for blocked in [s for s in legal_moves if s.blocked_by(mover, blocker)]:
-                    possible_moves.discard(blocked)
+            key = self
+        possible_moves = board._moves_cache.get(key)
+        if possible_moves is None:
+            # the same position might have come up on another board before
+            position = self.position
+            # kinds of pieces may share a letter
+            position_key = (board._hash, self.piece_type, self.letter, position.x, position.y)
+            if key is not self:
+                position_key += key[1:]
+            possible_moves = _possible_moves.get(position_key)
+            if possible_moves is None:
+                possible_moves = frozenset(self._possible_moves(board))
+                _possible_moves[position_key] = possible_moves
+                while len(_possible_moves) > POSSIBLE_MOVES_CACHE_SIZE:
+                    _possible_moves.popitem(last=False)
+            else:
+                _possible_moves.move_to_end(position_key)
+            board._moves_cache[key] = possible_moves
         return possible_moves
 
+    def _possible_moves(self, board):
+        """Generate the moves for :meth:`possible_moves`."""
+        return set(_squares(self.moves_bitboard(board)))
+
+    def moves_bitboard(self, board) -> int:
+        """Like :meth:`possible_moves`, but returns the moves as a bitboard
+        (see :meth:`.Board.occupied`) and without caching them. Only needs
+        to create :class:`.Square`\ s for kinds of pieces other than the
+        standard ones.
+        """
+        generate = _MOVE_GENERATORS.get(self.piece_type)
+        if generate is None:
+            generate = _slider_moves if getattr(self.piece, 'rays', None) is not None else _blocked_moves
+        return generate(self, board)
+
     def move_to(self, target, board=None):
         """Does not mutate but returns new piece
 
@@ -181,7 +194,15 @@ class Piece(AbstractPiece):
         if board is not None:
             if target not in self.possible_moves(board):
                 raise IllegalMoveError(str(self)+str(target))
-        return Piece(self.piece, self.color, target, touched=True)
+        if not isinstance(target, Square) or not target.within_board():
+            # the constructor converts or rejects the target
+            return Piece(self.piece, self.color, target, touched=True)
+        # skip deriving the kind, letters and symbol again
+        moved = Piece.__new__(Piece)
+        moved.__dict__.update(self.__dict__)
+        moved.position = target
+        moved.touched = True
+        return moved
 
 
 class King(AbstractPiece):
@@ -190,64 +211,52 @@ class King(AbstractPiece):
     def __init__(self):
         self.name = "King"
         self.letter = 'K'
-        self.symbol = {White:'♔', Black:'♚'}
+        self.symbol = ('♔', '♚')
 
     def legal_moves(self, position, *args, **kwargs):
-        moves = [
-            position + (+1,  0),
-            position + (-1,  0),
-            position + ( 0, +1),
-            position + ( 0, -1),
-
-            position + (+1, +1),
-            position + (-1, +1),
-            position + (+1, -1),
-            position + (-1, -1),
-        ]
-        moves = set(filter(within_board, moves))
-        return moves
+        return _LEGAL_MOVES['K'][position.index]
 
 
 class Queen(AbstractPiece):
     """Queen moves any number of squares in any direction (orthogonally and diagonally)."""
+    #: Directions the piece slides in, see :meth:`Piece.possible_moves`.
+    rays = _ORTHOGONAL_RAYS + _DIAGONAL_RAYS
 
     def __init__(self):
         self.name = "Queen"
         self.letter = 'Q'
-        self.symbol = {White:'♕', Black:'♛'}
+        self.symbol = ('♕', '♛')
 
     def legal_moves(self, position, *args, **kwargs):
-        moves = position.diagonals() | position.orthogonals()
-        moves.discard(position)
-        return moves
+        return _LEGAL_MOVES['Q'][position.index]
 
 
 class Rook(AbstractPiece):
     """Rook moves any number of squares orthogonally."""
+    #: Directions the piece slides in, see :meth:`Piece.possible_moves`.
+    rays = _ORTHOGONAL_RAYS
 
     def __init__(self):
         self.name = "Rook"
         self.letter = 'R'
-        self.symbol = {White:'♖', Black:'♜'}
+        self.symbol = ('♖', '♜')
 
     def legal_moves(self, position, *args, **kwargs):
-        moves = position.orthogonals()
-        moves.discard(position)
-        return moves
+        return _LEGAL_MOVES['R'][position.index]
 
 
 class Bishop(AbstractPiece):
     """Bishop moves any number of squares diagonally."""
+    #: Directions the piece slides in, see :meth:`Piece.possible_moves`.
+    rays = _DIAGONAL_RAYS
 
     def __init__(self):
         self.name = "Bishop"
         self.letter = 'B'
-        self.symbol = {White:'♗', Black:'♝'}
+        self.symbol = ('♗', '♝')
 
     def legal_moves(self, position, *args, **kwargs):
-        moves = position.diagonals()
-        moves.discard(position)
-        return moves
+        return _LEGAL_MOVES['B'][position.index]
 
 
 class Knight(AbstractPiece):
@@ -256,15 +265,10 @@ class Knight(AbstractPiece):
     def __init__(self):
         self.name = "Knight"
         self.letter = 'N'
-        self.symbol = {White:'♘', Black:'♞'}
+        self.symbol = ('♘', '♞')
 
     def legal_moves(self, position, *args, **kwargs):
-        verticals   = [position + (step, 0)      for step in [-2,+2]]
-        horizontals = [position + (0, step) for step in [-2,+2]]
-        moves  = [pos + (0, step) for pos in verticals   for step in [-1,+1]]
-        moves += [pos + (step, 0) for pos in horizontals for step in [-1,+1]]
-        moves = set(filter(within_board, moves))
-        return moves
+        return _LEGAL_MOVES['N'][position.index]
 
 
 class Pawn(AbstractPiece):
@@ -277,7 +281,12 @@ class Pawn(AbstractPiece):
         self.name = "Pawn"
         self.letter = 'P' if color == White else 'p'
         self.color = color
-        self.symbol = {White:'♙', Black:'♟'}
+        self.symbol = ('♙', '♟')
+        # the rank the pawn starts on, the one it is promoted on and the
+        # step forward in terms of Square.index
+        self._start_y = color.home_y+color.direction
+        self._promotion_y = (~color).home_y
+        self._step = BOARD_LEN*color.direction
 
     def __repr__(self):
         return super().__repr__()[:-1]+f" color={self.color}>"
@@ -294,24 +303,123 @@ class Pawn(AbstractPiece):
         """
         # TODO en passent
         # TODO promotion (raise exception?)
-        captures = [position + (d, self.color.direction) for d in [-1,+1]]
         if only_attacked:
-            return set(filter(within_board, captures))
-        captures = [sq for sq in captures if sq in board and board[sq].color is not self.color]
-
-        distance = [1]
-        if position.y == (~self.color).home_y: # opponent row
+            return _LEGAL_MOVES[self.letter][position.index]
+        if position.y == self._promotion_y: # opponent row
             # opponent home row, pawn promotion
-            return set([])
-        if position.y == self.color.home_y+self.color.direction:
+            return frozenset()
+        moves = _PAWN_ATTACKS[self.color.color][position.index] & board.occupied(~self.color)
+        one_step = position.index + self._step
+        moves |= 1 << one_step
+        if position.y == self._start_y:
             # starting row, can move two squares
-            distance.append(2)
-        moves = [position + (0, self.color.direction*dist) for dist in distance]
-        moves = set(filter(within_board, moves+captures))
-        return moves
+            moves |= 1 << (one_step + self._step)
+        return frozenset(_squares(moves))
 
 
 all_pieces = set([King(), Queen(), Rook(), Bishop(), Knight(), Pawn(White), Pawn(Black)])
 
 piece_by_letter = {p.letter: p for p in all_pieces}
 
+# kinds of pieces looked up during move generation
+_KING = piece_by_letter['K']
+_ROOK = piece_by_letter['R']
+
+
+# Move generation for Piece.moves_bitboard(), by kind of piece. Each takes the
+# piece and the board and returns its moves as a bitboard.
+
+def _slider_moves(piece, board):
+    """Sliding pieces move along their rays until they run into a piece,
+    which they can capture if it's an opponent's."""
+    index = piece.position.index
+    occupied = board.occupied()
+    moves = 0
+    for ray in piece.piece.rays:
+        moves |= _ray_attacks(ray, index, occupied)
+    # own pieces cannot by captured
+    return moves & ~board.occupied(piece.color)
+
+def _knight_moves(piece, board):
+    """Knights don't get blocked by other pieces."""
+    return _KNIGHT_ATTACKS[piece.position.index] & ~board.occupied(piece.color)
+
+def _king_moves(piece, board):
+    """Kings cannot move themselves into check."""
+    position = piece.position
+    color = piece.color
+    attacked = board.attacked(~color)
+    moves = _KING_ATTACKS[position.index] & ~board.occupied(color) & ~attacked
+    # the opponent's King is not part of the attacked squares to avoid
+    # infinite recursion. Wether blocked or not, two Kings can never sit
+    # adjacent. A Board may have no opponent King, while not being legal,
+    # this can happend for debug/testing purposes.
+    for opponent_king in board.pieces(kind=_KING, color=~color):
+        moves &= ~_KING_ATTACKS[opponent_king.position.index]
+    # castling
+    if not piece.touched and position == (4, color.home_y):
+        for rook in board.pieces(kind=_ROOK, color=color):
+            if (not rook.touched
+                and (rook.position == (0, color.home_y)
+                  or rook.position == (7, color.home_y))):
+                # we can only castle if neither the king nor the rook
+                # have been touched before. sitting in the original
+                # position is not enough
+
+                # wether the castling is queen or kingside
+                direction = 1 if rook.position.x > position.x else -1
+                # check if any pieces are between the rook and the king
+                blocked = False
+                for dist in range(1,int(position.dist(rook.position))):
+                    blocked |= position + (dist*direction,0) in board
+                # check if king is currently under check or moves
+                # through check
+                checked = False
+                for dist in [0,1,2]:
+                    checked |= bool(attacked >> (position + (dist*direction,0)).index & 1)
+                if not blocked and not checked:
+                    castling_target = position + (2*direction,0)
+                    moves |= 1 << castling_target.index
+    return moves
+
+def _pawn_moves(piece, board):
+    """Pawns capture diagonally, but cannot capture where they walk."""
+    position = piece.position
+    color = piece.color
+    pawn = piece.piece
+    if position.y == pawn._promotion_y:
+        # TODO promotion, pawns on the opponent's home rank are stuck
+        return 0
+    occupied = board.occupied()
+    moves = _PAWN_ATTACKS[color.color][position.index] & occupied & ~board.occupied(color)
+    one_step = position.index + pawn._step
+    if not occupied >> one_step & 1:
+        moves |= 1 << one_step
+        # from the starting rank, pawns can walk two steps unless the
+        # square in front is taken
+        two_step = one_step + pawn._step
+        if position.y == pawn._start_y and not occupied >> two_step & 1:
+            moves |= 1 << two_step
+    return moves
+
+def _blocked_moves(piece, board):
+    """Other kinds of pieces get blocked on the lines to the squares of their
+    legal moves, opponent pieces block, but can be captured."""
+    mover = piece.position
+    legal_moves = piece.piece.legal_moves(mover, board)
+    legal = _bitboard(legal_moves)
+    # own pieces cannot by captured
+    moves = legal & ~board.occupied(piece.color)
+    for blocker in _squares(legal & board.occupied()):
+        for blocked in [s for s in legal_moves if s.blocked_by(mover, blocker)]:
+            moves &= ~(1 << blocked.index)
+    return moves
+
+_MOVE_GENERATORS = {
+    King: _king_moves,
+    Queen: _slider_moves,
+    Rook: _slider_moves,
+    Bishop: _slider_moves,
+    Knight: _knight_moves,
+    Pawn: _pawn_moves,
+    }
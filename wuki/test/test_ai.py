@@ -33,3 +33,14 @@ def test_eval_center(ai_and_kings):
     board.add(Piece(Queen(), AI_COLOR, Square('d',6)))
     assert ai.eval_center(board) == 4
 
+
+def test_evaluate_board_transpositions(ai_and_kings):
+    ai, kings = ai_and_kings
+    board = Board(kings+[Piece(Queen(), AI_COLOR, Square('d', 4))])
+    score = ai.evaluate_board(board)
+    assert len(ai._transpositions) == 1
+    assert ai.evaluate_board(Board(kings+[Piece(Queen(), AI_COLOR, Square('d', 4))])) == score
+    assert len(ai._transpositions) == 1
+    board.capture(board[Square('d', 4)])
+    assert ai.evaluate_board(board) != score
+    assert len(ai._transpositions) == 2
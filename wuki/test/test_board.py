@@ -1,12 +1,19 @@
 import pytest
+import pickle
 from math import sqrt
 
 from ..board import Color, White, Black, Square, BOARD_LEN, within_board, Board
-from ..piece import Piece, Queen, King, Pawn, Rook
+from ..board import _bitboard, _squares, _ray_attacks
+from .. import board as board_module
+from ..piece import Piece, Queen, King, Pawn, Rook, Bishop, Knight
 from ..exceptions import IllegalMoveError
 
 from .test_piece import castling_board
 
+def test_Color_index():
+    assert ('white', 'black')[White] == 'white'
+    assert ('white', 'black')[Black] == 'black'
+
 def test_Color_constants():
     white = Color(Color.WHITE)
     black = Color(Color.BLACK)
@@ -23,6 +30,8 @@ def test_Color_negation():
     assert ~White == Black
     assert ~Black == White
     assert White != Black
+    assert ~White is Black
+    assert ~Color(Color.BLACK) is White
 
 def test_Color_str():
     assert str(White) == 'white'
@@ -68,6 +77,26 @@ def test_Square_init_malformed():
     with pytest.raises(ValueError):
         Square('z', 5)
 
+def test_Square_interned():
+    assert Square('c', 4) is Square(2, 3)
+    assert Square('c4') is Square((2, 3))
+    assert Square(2, 3) + (1, 1) is Square('d', 5)
+    assert pickle.loads(pickle.dumps(Square('c', 4))) is Square('c', 4)
+    # squares off the board are not kept around
+    assert Square(-1, 0) == Square(-1, 0)
+
+def test_Square_slots():
+    square = Square('c', 4)
+    assert not hasattr(square, '__dict__')
+    assert hash(square) == hash((2, 3))
+    assert square in {(2, 3)}
+
+def test_Square_index():
+    assert Square('a', 1).index == 0
+    assert Square('h', 1).index == 7
+    assert Square('a', 2).index == 8
+    assert Square('h', 8).index == 63
+
 def test_Square_file_rank():
     sq = Square('c',4)
     file_, rank = sq.file_rank()
@@ -134,6 +163,7 @@ def test_Square_diagonals():
 def test_Square_orthogonals():
     sq = Square('c', 7)
     assert sq.orthogonals() == set([Square(x, sq.y) for x in range(BOARD_LEN)]) | set([Square(sq.x, y) for y in range(BOARD_LEN)])
+    assert Square('c', 7).orthogonals() is sq.orthogonals()
 
 def test_Square_dist():
     assert Square(0,0).dist(Square(1,0)) == 1.
@@ -165,6 +195,28 @@ def test_Square_blocket_by_diag():
     blocked = set([square for square, _ in board if square.blocked_by(mover, blocker)])
     assert blocked == set([Square(0,0)])
 
+def test_Board_outside_of_board():
+    # squares outside of the board don't share the index of one on it
+    board = Board([Piece(Queen(), White, Square('a', 2))])
+    assert Square(8, 0) not in board
+    assert Square(-1, 0) not in board
+    with pytest.raises(KeyError):
+        board[Square(8, 0)]
+
+def test_bitboard_squares():
+    squares = [Square('a', 1), Square('e', 4), Square('h', 8)]
+    assert _bitboard(squares) == 1 | 1 << 28 | 1 << 63
+    assert _squares(_bitboard(squares)) == squares
+    assert _squares(0) == []
+
+def test_ray_attacks():
+    mover = Square('d', 4)
+    blockers = _bitboard([Square('d', 6), Square('b', 4), Square('a', 1)])
+    assert set(_squares(_ray_attacks((0, +1), mover.index, blockers))) == {Square('d', 5), Square('d', 6)}
+    assert set(_squares(_ray_attacks((-1, 0), mover.index, blockers))) == {Square('c', 4), Square('b', 4)}
+    assert set(_squares(_ray_attacks((-1, -1), mover.index, blockers))) == {Square('c', 3), Square('b', 2), Square('a', 1)}
+    assert set(_squares(_ray_attacks((+1, 0), mover.index, blockers))) == {Square('e', 4), Square('f', 4), Square('g', 4), Square('h', 4)}
+
 def test_Board_init():
     pos = Square('d', 5)
     queen = Piece(Queen(), White, pos)
@@ -266,6 +318,29 @@ def test_Board_pieces():
     assert board.pieces(color=White) == set([pieces[0]])
     assert board.pieces(kind=King(), color=White) == set()
 
+def test_Board_occupied():
+    queen = Piece(Queen(), White, Square('b', 1))
+    king = Piece(King(), Black, Square('a', 2))
+    board = Board([queen, king])
+    assert board.occupied(White) == 1 << 1
+    assert board.occupied(Black) == 1 << 8
+    assert board.occupied() == 1 << 1 | 1 << 8
+    new_board = board.make_move(queen, Square('a', 2))
+    assert new_board.occupied(White) == 1 << 8
+    assert new_board.occupied(Black) == 0
+    assert board.occupied() == 1 << 1 | 1 << 8
+
+def test_Board_pieces_after_moves():
+    queen = Piece(Queen(), White, Square('d', 5))
+    king = Piece(King(), Black, Square('a', 8))
+    board = Board([queen, king])
+    new_board = board.make_move(queen, Square('a', 8))
+    assert new_board.pieces(kind=Queen(), color=White) == {Piece(Queen(), White, Square('a', 8))}
+    assert new_board.pieces(kind=King()) == set()
+    assert board.pieces(kind=King()) == {king}
+    new_board.remove(new_board[Square('a', 8)])
+    assert new_board.pieces(kind=Queen()) == set()
+
 def test_Board_add():
     board = Board([])
     pos = Square('d', 5)
@@ -329,6 +404,15 @@ def test_Board_make_move_illegal():
     with pytest.raises(IllegalMoveError):
         board.make_move(king, target)
 
+def test_Board_capture_own_piece():
+    king = Piece(King(), White, Square('d', 5))
+    queen = Piece(Queen(), White, Square('d', 6))
+    board = Board([king, queen])
+    with pytest.raises(IllegalMoveError, match=str(queen)):
+        board.make_move(king, queen.position)
+    with pytest.raises(IllegalMoveError, match=str(queen)):
+        board.do_move(king, queen.position)
+
 def test_Bord_make_move_capture():
     color = White
     pos_a = Square(('d', 5))
@@ -367,6 +451,56 @@ def test_Board_make_move_check():
     board = Board([king,attacker])
     board.make_move(attacker, Square('a',8))
 
+def test_Board_do_move_undo_move():
+    king = Piece(King(), White, Square('a', 1))
+    queen = Piece(Queen(), Black, Square('a', 8))
+    board = Board([king, queen])
+    before = board.copy()
+    undo = board.do_move(queen, Square('a', 1))
+    assert board[Square('a', 1)] == Queen()
+    assert Square('a', 8) not in board
+    assert board.captured[White] == {king}
+    board.undo_move(undo)
+    assert board == before
+    assert board.index == before.index
+
+def test_Board_do_move_undo_move_castling(castling_board):
+    before = castling_board.copy()
+    undo = castling_board.do_move(castling_board[Square('e1')], Square('g1'))
+    assert castling_board[Square('f1')] == Rook()
+    castling_board.undo_move(undo)
+    assert castling_board == before
+    assert castling_board[Square('h1')] == Rook()
+
+def test_Board_hash():
+    knight_w = Piece(Knight(), White, Square('b', 1))
+    knight_b = Piece(Knight(), Black, Square('b', 8))
+    board = Board([knight_w, knight_b])
+    hash_ = board._hash
+    # same position reached in a different order
+    transposed = board.make_move(knight_w, Square('c', 3)).make_move(knight_b, Square('c', 6))
+    other = board.make_move(knight_b, Square('c', 6)).make_move(knight_w, Square('c', 3))
+    assert transposed._hash == other._hash != hash_
+    assert transposed._hash == Board(transposed.pieces())._hash
+    undo = board.do_move(knight_w, Square('a', 3))
+    assert board._hash != hash_
+    board.undo_move(undo)
+    assert board._hash == hash_
+
+def test_Board_hash_other_kind():
+    class Castle(Rook):
+        pass
+    class Archbishop(Bishop):
+        def __init__(self):
+            super().__init__()
+            self.letter = 'A'
+    square = Square('d', 4)
+    rook = Board([Piece(Rook(), White, square)])._hash
+    castle = Board([Piece(Castle(), White, square)])._hash
+    archbishop = Board([Piece(Archbishop(), White, square)])._hash
+    assert len({rook, castle, archbishop}) == 3
+    assert castle == Board([Piece(Castle(), White, square)])._hash
+
 def test_Board_make_move_castling(castling_board):
     king_w = castling_board[Square('e1')]
     king_b = castling_board[Square('e8')]
@@ -423,6 +557,20 @@ def test_Board_possible_moves_check():
             Piece(Queen(), Black, Square('a', 8))]
     assert Board(pieces).possible_moves(White) == set([(pieces[1], Square('a', 5))])
 
+def test_Board_possible_moves_pinned():
+    king = Piece(King(), White, Square('a', 1))
+    rook = Piece(Rook(), White, Square('a', 3))
+    bishop = Piece(Bishop(), White, Square('c', 2))
+    knight = Piece(Knight(), White, Square('b', 2))
+    pieces = [king, rook, bishop, knight,
+              Piece(Queen(), Black, Square('a', 8)), Piece(Bishop(), Black, Square('e', 5))]
+    board = Board(pieces)
+    assert board._pinned(White) == _bitboard([rook.position, knight.position])
+    moves = board.possible_moves(White)
+    assert {target for piece, target in moves if piece is rook} == {Square('a', y) for y in (2, 4, 5, 6, 7, 8)}
+    assert {piece for piece, target in moves if piece is knight} == set()
+    assert {target for piece, target in moves if piece is bishop} == bishop.possible_moves(board)
+
 def test_Board_is_check_no():
     assert Board([Piece(King(), White, Square('d', 5))]).is_check(White) == False
 
@@ -432,6 +580,46 @@ def test_Board_is_check_yes():
     board.print(mark=queen.possible_moves(board))
     assert Board([Piece(King(), White, Square('a', 1)), Piece(Queen(), Black, Square('a', 8))]).is_check(White) == True
 
+def test_Board_attacked():
+    pawn = Piece(Pawn(White), White, Square('b', 2))
+    rook = Piece(Rook(), Black, Square('a', 8))
+    board = Board([pawn, rook])
+    assert board.attacked(White) == 1 << Square('a', 3).index | 1 << Square('c', 3).index
+    assert board.attacked(Black) == sum(1 << square.index for square in rook.possible_moves(board))
+    board.remove(pawn)
+    assert board.attacked(White) == 0
+
+def test_Board_attacked_by_position():
+    rook = Piece(Rook(), Black, Square('a', 8))
+    attacked = Board([rook]).attacked(Black)
+    board = Board([rook])
+    assert board_module._attacked[board._hash, Black.color] == attacked
+    assert board.attacked(Black) == attacked
+
+def test_Board_is_attacked():
+    board = Board([Piece(Rook(), Black, Square('a', 8)),
+            Piece(Bishop(), Black, Square('h', 8)),
+            Piece(Knight(), Black, Square('c', 3)),
+            Piece(Pawn(Black), Black, Square('f', 3)),
+            Piece(Pawn(White), White, Square('b', 7))])
+    assert board.is_attacked(Square('a', 1), Black)   # rook along the file
+    assert board.is_attacked(Square('e', 5), Black)   # bishop along the diagonal
+    assert board.is_attacked(Square('d', 1), Black)   # knight
+    assert board.is_attacked(Square('e', 2), Black)   # pawn
+    assert not board.is_attacked(Square('f', 2), Black)   # pawns don't attack forward
+    assert not board.is_attacked(Square('a', 6), White)
+
+def test_Board_is_attacked_blocked():
+    board = Board([Piece(Queen(), Black, Square('a', 8)),
+            Piece(Pawn(White), White, Square('a', 4))])
+    assert board.is_attacked(Square('a', 5), Black)
+    assert not board.is_attacked(Square('a', 1), Black)
+
+def test_Board_is_attacked_through():
+    board = Board([Piece(Queen(), Black, Square('a', 8))])
+    assert board.is_attacked(Square('a', 1), Black, through={Square('a', 4)})
+    assert not board.is_attacked(Square('a', 1), Black, through={Square('b', 4)})
+
 def test_Board_is_checkmate_no():
     """This is not a checkmate as a piece can be moved in between."""
     pieces = [Piece(King(), White, Square('a', 1)),
@@ -1,3 +1,7 @@
+import os
+import sys
+import subprocess
+
 import pytest
 
 from ..cli import CLI, BreakInteractiveException
@@ -6,7 +10,14 @@ from ..board import White, Black, Square, Board
 from ..piece import Piece, King, Pawn
 
 from .test_game import ambigous_game
-
+from .. import cli as cli_module
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep the game cache out of the user's cache directory."""
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setattr(cli_module, 'CACHE_DIR', str(cache_dir))
+    return cache_dir
 @pytest.fixture
 def mock_input(request,monkeypatch):
     """Mock the data provided to stdin. After all inputs have been provided,
@@ -34,6 +45,7 @@ def test_init(tmp_path):
     assert cli.args.flip == False
     assert cli.args.move == None
     assert cli.args.auto_save == False
+    assert cli.args.no_cache == False
     assert isinstance(cli.game, Game)
 
     cli = CLI(['-a'])
@@ -52,6 +64,21 @@ def test_init(tmp_path):
     assert cli.args.move == 'a3'
     cli = CLI(['-s'])
     assert cli.args.auto_save == True
+    cli = CLI(['-N'])
+    assert cli.args.no_cache == True
+
+def test_help_does_not_import_engine():
+    code = ("import sys\n"
+            "from wuki.cli import CLI\n"
+            "try:\n"
+            "    CLI(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print([m for m in ('wuki.game', 'wuki.board', 'wuki.ai') if m in sys.modules])\n")
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, '-c', code], cwd=root,
+            capture_output=True, text=True, check=True).stdout
+    assert out.splitlines()[-1] == '[]'
 
 def test_main_print(capsys):
     cli = CLI([])
@@ -70,6 +97,18 @@ def test_main_print_full_game(capsys):
     func_out = capsys.readouterr().out
     assert func_out in main_out
 
+def test_print_full_game_history(capsys):
+    cli = CLI([])
+    cli.game = Game(['e4', 'e5', 'Nf3'], history=2)
+    cli.print_full_game()
+    out = capsys.readouterr().out
+    Game(['e4', 'e5']).board.print()
+    print()
+    print("2. white: g1Nf3")
+    cli.game.board.print()
+    print()
+    assert out == capsys.readouterr().out
+
 def test_main_move():
     cli = CLI(['--move', 'a4'])
     cli.main()
@@ -111,6 +150,37 @@ Bb5
     cli = CLI(['--match-file', str(match_file)])
     assert cli.parse_match_file() == moves_list
 
+def test_load_game_cache(tmp_path, monkeypatch):
+    match_file = tmp_path / 'match.txt'
+    match_file.write_text("e4 e5\nNf3\n")
+    cli = CLI(['--match-file', str(match_file)])
+    assert len(cli.game) == 3
+
+    def no_replay(self):
+        raise AssertionError("match file was replayed")
+    monkeypatch.setattr(CLI, 'parse_match_file', no_replay)
+    cached = CLI(['--match-file', str(match_file)])
+    assert str(cached.game) == str(cli.game)
+    assert cached.game.boards[-1] == cli.game.boards[-1]
+
+    # touched but unchanged file is recognized by its content
+    stat = match_file.stat()
+    os.utime(match_file, ns=(stat.st_atime_ns, stat.st_mtime_ns+10**9))
+    assert len(CLI(['--match-file', str(match_file)]).game) == 3
+
+def test_load_game_cache_changed(tmp_path):
+    match_file = tmp_path / 'match.txt'
+    match_file.write_text("e4 e5\n")
+    assert len(CLI(['--match-file', str(match_file)]).game) == 2
+    match_file.write_text("e4 e5\nNf3\n")
+    assert len(CLI(['--match-file', str(match_file)]).game) == 3
+
+def test_load_game_no_cache(tmp_path, cache_dir):
+    match_file = tmp_path / 'match.txt'
+    match_file.write_text("e4 e5\n")
+    assert len(CLI(['--no-cache', '--match-file', str(match_file)]).game) == 2
+    assert not cache_dir.exists()
+
 def test_write_match_file(tmp_path):
     moves_str = """e2Pe4 e7Pe5
 g1Nf3 b8Nc6
@@ -133,6 +203,12 @@ def test_make_move():
     cli.make_move('a4')
     assert Square('a', 4) in cli.game.boards[-1]
 
+def test_make_move_tuple():
+    cli = CLI([])
+    board = cli.game.boards[-1]
+    cli.make_move((board[Square('a', 2)], Square('a', 4)))
+    assert Square('a', 4) in cli.game.boards[-1]
+
 def test_make_move_auto_save(tmp_path):
     match_file = tmp_path / 'match.txt'
     cli = CLI(['--auto-save', '--match-file', str(match_file)])
@@ -140,6 +216,16 @@ def test_make_move_auto_save(tmp_path):
     cli.make_move(move)
     assert match_file.read_text().rstrip('\n') == move
 
+def test_make_move_auto_save_appends(tmp_path):
+    match_file = tmp_path / 'match.txt'
+    cli = CLI(['--auto-save', '--match-file', str(match_file)])
+    for move in ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5']:
+        cli.make_move(move)
+        assert match_file.read_text() == str(cli.game)
+    cli.cmd_undo()
+    cli.make_move('Bc4')
+    assert match_file.read_text() == str(cli.game)
+
 @pytest.mark.mock_input_data('a4')
 def test_interactive_loop_move(mock_input):
     cli = CLI(['--interactive'])
@@ -147,6 +233,14 @@ def test_interactive_loop_move(mock_input):
         cli.interactive_loop()
     assert Square('a', 4) in cli.game.boards[-1]
 
+@pytest.mark.mock_input_data('move a4', 'e5', 'undo')
+def test_interactive_loop_commands(mock_input):
+    cli = CLI(['--interactive'])
+    with pytest.raises(BreakInteractiveException):
+        cli.interactive_loop()
+    assert len(cli.game) == 1
+    assert Square('a', 4) in cli.game.boards[-1]
+
 @pytest.mark.mock_input_data('exit')
 def test_interactive_loop_exit(mock_input):
     cli = CLI(['--interactive'])
@@ -1,6 +1,7 @@
 import pytest
 
-from ..game import Game
+from ..game import Game, _parse_san, _split_move
+from .. import game as game_module
 from .. import piece
 from ..board import White, Black, Board, Square
 from ..exceptions import MoveParseError, WrongPlayerError, IllegalMoveError, AmbigousMoveError
@@ -56,6 +57,16 @@ def test_Game_init_move():
     assert target in game.boards[1]
     assert game.boards[1][target] == piece.Piece(piece.Knight(), Game.FIRST_PLAYER, target)
 
+def test_Game_init_malformed():
+    with pytest.raises(MoveParseError) as error:
+        Game(['e4', 'e5', 'Nf3', 'xx'])
+    assert error.value.move == 'xx'
+
+def test_Game_init_castling():
+    game = Game(['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', '0-0'])
+    assert game.board[Square('g', 1)] == piece.King()
+    assert game.changed_squares() == set(map(Square, ['e1', 'f1', 'g1', 'h1']))
+
 def test_Game_repr(moves):
     assert repr(Game(moves)) == '<Game moves=6 current_player=white>'
 
@@ -75,9 +86,52 @@ f1Bb5
     print(moves_list)
     assert str(Game(moves_list)) == moves_str
 
+def test_Game_str_incremental():
+    game = Game([])
+    assert str(game) == '\n'
+    game.make_move('e4')
+    assert str(game) == 'e2Pe4\n'
+    game.make_move('e5')
+    game.make_move('Nf3')
+    assert str(game) == 'e2Pe4 e7Pe5\ng1Nf3\n'
+    game.undo(2)
+    assert str(game) == 'e2Pe4\n'
+    game.make_move('d5')
+    assert str(game) == 'e2Pe4 d7Pd5\n'
+
 def test_Game_parse_move():
     assert Game([]).parse_move('g1Nf3') == (piece.Piece(piece.Knight(), Game.FIRST_PLAYER, Square('g', 1)), Square('f', 3))
 
+@pytest.mark.parametrize('move,parts', [
+    ('e4',    (None, None, '',  'e', '4')),
+    ('Nf3',   (None, None, 'N', 'f', '3')),
+    ('ed5',   ('e',  None, '',  'd', '5')),
+    ('1Ra4',  (None, '1',  'R', 'a', '4')),
+    ('e2Pe4', ('e',  '2',  'P', 'e', '4')),
+    ('Qh5+',  (None, None, 'Q', 'h', '5')),
+    ('e',     None),
+    ('Xe4',   None),
+    ])
+def test_parse_san(move, parts):
+    assert _parse_san(move) == parts
+
+@pytest.mark.parametrize('move', ['e4', 'Nf3', 'ed5', '1Ra4', 'e2Pe4', 'Qh5+', 'e', 'Xe4'])
+def test_split_move(move):
+    assert _split_move(move) == _parse_san(move)
+
+def test_Game_fully_qualified_moves(monkeypatch):
+    moves = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6']
+    game_str = str(Game(moves))
+    qualified = game_str.split()
+    # fully qualified moves don't need to be scanned for optional parts
+    monkeypatch.setattr(game_module, '_parse_san', None)
+    replayed = Game(qualified)
+    assert str(replayed) == game_str
+    game = Game([])
+    for move, board in zip(qualified, replayed.boards[1:]):
+        game.make_move(*game.parse_move(move))
+        assert game.board == board
+
 def test_Game_parse_move_wrong_format():
     move = 'string'
     with pytest.raises(MoveParseError) as error:
@@ -92,6 +146,13 @@ def test_Game_parse_move_wrong_piece():
     assert error.value.move == move
     assert "Specified source piece and piece on that square do not match (is None)"
 
+def test_Game_parse_move_empty_source():
+    for move in ['e3Pe4', 'e3e4']:
+        with pytest.raises(MoveParseError) as error:
+            Game([]).parse_move(move)
+        assert error.value.move == move
+        assert error.value.reason == 'No piece on source square e3'
+
 def test_Game_parse_move_wrong_player():
     with pytest.raises(MoveParseError):
         Game([]).parse_move('b8Nc6')
@@ -109,6 +170,16 @@ def test_Game_parse_move_inference_hint(ambigous_game):
     assert ambigous_game.parse_move('fNe5') == (piece.Piece(piece.Knight(), White, Square('f',7)), Square('e',5))
     assert ambigous_game.parse_move('3Ne5') == (piece.Piece(piece.Knight(), White, Square('d',3)), Square('e',5))
 
+def test_Game_parse_move_source_cache():
+    game = Game(['Nf3', 'Nf6', 'Nc3'])
+    transposed = Game(['Nc3', 'Nf6', 'Nf3'])
+    transposed._source_cache = game._source_cache
+    assert game.parse_move('Nc6') == transposed.parse_move('Nc6')
+    assert len(game._source_cache) == 4
+    game.SOURCE_CACHE_SIZE = 2
+    game.parse_move('e5')
+    assert len(game._source_cache) == 2
+
 def test_Game_parse_move_castling(castling_board):
     game = Game([])
     game.boards[-1] = castling_board
@@ -121,6 +192,8 @@ def test_Game_parse_move_castling_impossible():
         game.parse_move('0-0-0')
     with pytest.raises(MoveParseError):
         game.parse_move('0-0')
+    with pytest.raises(MoveParseError):
+        game.parse_move('0-1')
 
 def test_Game_move_str():
     game = Game([])
@@ -220,6 +293,52 @@ def test_Game_undo():
     assert len(game) == 0
     assert game.current_player == White
 
+def test_Game_history():
+    game = Game(['e4', 'e5', 'Nf3'], history=2)
+    assert len(game.boards) == 2
+    assert len(game) == 3
+    assert Square('f', 3) in game.board
+    game.undo()
+    assert len(game) == 2
+    assert game.current_player == White
+    assert Square('f', 3) not in game.board
+    game.undo()
+    assert len(game) == 2
+
+def test_Game_history_str_undo():
+    game = Game(['e4', 'e5', 'Nf3', 'Nc6'], history=2)
+    assert str(game) == 'e2Pe4 e7Pe5\ng1Nf3 b8Nc6\n'
+    game.undo(2)
+    assert len(game) == 4
+    assert str(game) == 'e2Pe4 e7Pe5\ng1Nf3 b8Nc6\n'
+    game.undo()
+    game.undo()
+    assert len(game) == 3
+    assert game.current_player == Black
+    assert str(game) == 'e2Pe4 e7Pe5\ng1Nf3\n'
+    assert game.board == Game(['e4', 'e5', 'Nf3']).board
+
+def test_Game_changed_squares():
+    game = Game(['e4'])
+    assert game.changed_squares() == {Square('e', 2), Square('e', 4)}
+
+def test_Game_make_move_check():
+    game = Game(['e4', 'f5', 'Qh5'])
+    assert game.check == Black
+    game.make_move('g6')
+    assert game.check is None
+    game.undo()
+    assert game.check == Black
+
+def test_Game_make_move_check_discovered():
+    pieces = [piece.Piece(piece.King(), Black, Square('a', 8)),
+            piece.Piece(piece.Bishop(), White, Square('e', 8)),
+            piece.Piece(piece.Rook(), White, Square('h', 8))]
+    game = Game([])
+    game.boards[-1] = Board(pieces)
+    game.make_move(pieces[1], Square('d', 7))
+    assert game.check == Black
+
 def test_Game_check_state_regular():
     game = Game([])
     game.check_state(White)
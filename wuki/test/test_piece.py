@@ -55,6 +55,7 @@ def test_Piece_init():
     assert piece_.color == color
     assert piece_.piece == abs_piece
     assert piece_.letter == abs_piece.letter if color == White else abs_piece.letter.lower()
+    assert piece_.letter_upper == abs_piece.letter.upper()
     assert piece_.symbol == abs_piece.symbol[color]
     assert piece_.position == pos
     assert piece_.piece.legal_moves == abs_piece.legal_moves
@@ -112,11 +113,46 @@ def test_Piece_possible_moves():
     board = Board([piece_])
     assert piece_.possible_moves(board) == abs_piece.legal_moves(pos, board=board)
 
+def test_Piece_possible_moves_other_kind():
+    # kinds of pieces without rays are blocked by the squares they share a
+    # line with
+    class Castle(AbstractPiece):
+        def __init__(self):
+            self.name = 'Castle'
+            self.letter = 'C'
+            self.symbol = Rook().symbol
+        def legal_moves(self, position, *args, **kwargs):
+            return Rook().legal_moves(position)
+    pieces = [Piece(Castle(), White, Square('d', 4)), Piece(Pawn(White), White, Square('d', 6)), Piece(Pawn(Black), Black, Square('b', 4))]
+    rook = Piece(Rook(), White, Square('d', 4))
+    assert pieces[0].possible_moves(Board(pieces)) == rook.possible_moves(Board([rook]+pieces[1:]))
+
+def test_Piece_possible_moves_shared_letter():
+    # possible moves are remembered by position, kinds of pieces sharing a
+    # letter must not get each other's
+    class Hopper(AbstractPiece):
+        def __init__(self):
+            self.name = 'Hopper'
+            self.letter = 'R'
+            self.symbol = Rook().symbol
+        def legal_moves(self, position, *args, **kwargs):
+            return {position+(1,1)}
+    pos = Square('d', 4)
+    rook = Piece(Rook(), White, pos)
+    board = Board([rook])
+    assert len(rook.possible_moves(board)) == 14
+    assert Piece(Hopper(), White, pos).possible_moves(board) == {pos+(1,1)}
+    hopper = Piece(Hopper(), White, pos)
+    assert hopper.possible_moves(Board([hopper])) == {pos+(1,1)}
+
+def test_Piece_moves_bitboard(castling_board):
+    for piece_ in castling_board.pieces():
+        assert piece_.moves_bitboard(castling_board) == sum(1 << square.index for square in piece_.possible_moves(castling_board))
+
 def test_Piece_possible_moves_blocked_diag():
     pos = Square('a',1)
     pieces = [Piece(Queen(), White, pos), Piece(Pawn(White), White, pos+(2,2))]
-    orthos = pos.orthogonals()
-    orthos.discard(pos)
+    orthos = pos.orthogonals() - {pos}
     assert pieces[0].possible_moves(Board(pieces)) == orthos | {pos+(1,1)}
 
 def test_Piece_possible_moves_blocked_ortho():
@@ -194,6 +230,26 @@ def test_Piece_possible_moves_castling_touched(castling_board):
     assert king_w.possible_moves(castling_board) == set(map(Square, ['d1', 'f1']))
     assert king_b.possible_moves(castling_board) == set(map(Square, ['d8', 'f8', 'g8']))
 
+def test_Piece_possible_moves_cached(castling_board):
+    king_w = castling_board[Square('e1')]
+    rook_w = castling_board[Square('h1')]
+    moves = rook_w.possible_moves(castling_board)
+    assert rook_w.possible_moves(castling_board) is moves
+    assert Square('g1') in king_w.possible_moves(castling_board)
+    # castling rights are not part of the board
+    rook_w.touched = True
+    assert Square('g1') not in king_w.possible_moves(castling_board)
+    # changing the board resets the cache
+    castling_board.add(Piece(Knight(), White, Square('f1')))
+    assert rook_w.possible_moves(castling_board) == {Square('g1')}
+
+def test_Piece_possible_moves_cached_by_position(castling_board):
+    rook_w = castling_board[Square('h1')]
+    moves = rook_w.possible_moves(castling_board)
+    assert rook_w.possible_moves(castling_board.copy()) is moves
+    moved = castling_board.make_move(rook_w, Square('g1'))
+    assert rook_w.possible_moves(moved) is not moves
+
 def test_Piece_possible_moves_castling_blocked(castling_board):
     king_w = castling_board[Square('e1')]
     castling_board.add(Piece(Knight(), White, Square('b1')))
@@ -301,6 +357,12 @@ def test_Knight_legal_moves():
     assert knight.legal_moves(Square('f', 3)) == set(map(Square,[('e',5), ('d',4), ('d', 2), ('e',1), ('g', 1), ('h',2), ('h',4), ('g',5)]))
     assert knight.legal_moves(Square('g', 1)) == set(map(Square,[('e',2), ('f',3), ('h', 3)]))
 
+def test_legal_moves_cached():
+    for kind in [King(), Queen(), Rook(), Bishop(), Knight()]:
+        moves = kind.legal_moves(Square('c', 5))
+        assert isinstance(moves, frozenset)
+        assert kind.legal_moves(Square('c', 5)) is moves
+
 
 def test_Pawn_init():
     color = White